@@ -9,6 +9,7 @@ from tensorflow.keras.losses import mean_squared_error
 from tensorflow.keras.preprocessing.image import ImageDataGenerator
 from tensorflow.keras.models import load_model
 from pathlib import Path
+from app.models.DEEP_STEGO.Utils.preprocessing import normalize_batch, normalize_uint8, postprocess_batch
 
 '''
 Evaluates the trained model on a new dataset
@@ -21,20 +22,6 @@ BATCH_SIZE = 1
 TEST_NUM = len(glob.glob(str(EVAL_PATH)))
 
 
-# Normalize input for evaluation
-def normalize_batch(imgs):
-    return (imgs - np.array([0.485, 0.456, 0.406])) / np.array([0.229, 0.224, 0.225])
-
-
-# Denormalize output for prediction
-def denormalize_batch(imgs, should_clip=True):
-    imgs = (imgs * np.array([0.229, 0.224, 0.225])) + np.array([0.485, 0.456, 0.406])
-
-    if should_clip:
-        imgs = np.clip(imgs, 0, 1)
-    return imgs
-
-
 # Create a data generator for evaluation
 test_imgen = ImageDataGenerator(rescale=1. / 255)
 
@@ -87,23 +74,16 @@ Plots the input and output for verification
 
 # Perform prediction for single input
 def predict(source, cover):
-    # Normalize inputs
-    secret = np.array(source / 255.0)
-    cover = np.array(cover / 255.0)
+    # Normalize uint8 inputs straight to float32
+    secret = normalize_uint8(np.reshape(source, (1, 224, 224, 3)))
+    cover = normalize_uint8(np.reshape(cover, (1, 224, 224, 3)))
 
     # Predict output
-    coverout, secretout = model.predict(
-        [normalize_batch(np.reshape(secret, (1, 224, 224, 3))), normalize_batch(np.reshape(cover, (1, 224, 224, 3)))])
-
-    # Postprocess output cover image
-    coverout = denormalize_batch(coverout)
-    coverout = np.squeeze(coverout) * 255.0
-    coverout = np.uint8(coverout)
-
-    # Postprocess output secret image
-    secretout = denormalize_batch(secretout)
-    secretout = np.squeeze(secretout) * 255.0
-    secretout = np.uint8(secretout)
+    coverout, secretout = model.predict([secret, cover])
+
+    # Postprocess output images
+    coverout = np.squeeze(postprocess_batch(coverout))
+    secretout = np.squeeze(postprocess_batch(secretout))
 
     # Plot output images
     fig_out, ax_out = plt.subplots(1, 2, figsize=(10, 10))
@@ -1,18 +1,117 @@
+import io
 import numpy as np
+from PIL import Image
+
+
+# ImageNet channel statistics, kept in float32 so batches are never promoted to float64
+MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+# uint8 pixel -> normalized value as a single multiply-add: (x / 255 - mean) / std
+UINT8_SCALE = (1.0 / (255.0 * STD)).astype(np.float32)
+UINT8_SHIFT = (-MEAN / STD).astype(np.float32)
+
+# normalized value -> 0..255 as a single multiply-add: (x * std + mean) * 255
+OUTPUT_SCALE = (STD * 255.0).astype(np.float32)
+OUTPUT_SHIFT = (MEAN * 255.0).astype(np.float32)
 
 
 # Preprocessing functions
 def normalize_batch(images):
     """Performs channel-wise z-score normalization"""
 
-    return (images - np.array([0.485, 0.456, 0.406])) / np.array([0.229, 0.224, 0.225])
+    return (images - MEAN) / STD
 
 
 def denormalize_batch(images, should_clip=True):
     """Denormalize the images for prediction"""
 
-    images = (images * np.array([0.229, 0.224, 0.225])) + np.array([0.485, 0.456, 0.406])
+    images = (images * STD) + MEAN
 
     if should_clip:
         images = np.clip(images, 0, 1)
     return images
+
+
+def normalize_uint8(images, out=None):
+    """Normalizes uint8 images straight to float32, writing into out when given"""
+
+    if out is None:
+        out = np.empty(images.shape, dtype=np.float32)
+    np.multiply(images, UINT8_SCALE, out=out)
+    out += UINT8_SHIFT
+    return out
+
+
+def postprocess_batch(outputs, out=None):
+    """Turns normalized model outputs into uint8 images
+
+    Denormalizes, scales and clips outputs in place, then writes the uint8 result into out when given.
+    """
+
+    if not outputs.flags.writeable or outputs.dtype != np.float32:
+        outputs = np.array(outputs, dtype=np.float32)
+    outputs *= OUTPUT_SCALE
+    outputs += OUTPUT_SHIFT
+    np.clip(outputs, 0, 255, out=outputs)
+
+    if out is None:
+        out = np.empty(outputs.shape, dtype=np.uint8)
+    np.copyto(out, outputs, casting='unsafe')
+    return out
+
+
+class BatchBuffer:
+    """Reusable float32 model input buffer, filled image by image from uint8 arrays"""
+
+    def __init__(self, batch_size, shape=(224, 224, 3)):
+        self.data = np.empty((batch_size,) + tuple(shape), dtype=np.float32)
+
+    def fill(self, images):
+        """Normalizes uint8 images into the buffer, returns the filled view"""
+
+        count = len(images)
+        shape = images[0].shape
+        if count > len(self.data) or self.data.shape[1:] != shape:
+            self.data = np.empty((max(count, len(self.data)),) + shape, dtype=np.float32)
+        for i, image in enumerate(images):
+            normalize_uint8(image, out=self.data[i])
+        return self.data[:count]
+
+
+def load_image(source, size=224):
+    """Loads an image as a uint8 RGB array
+
+    source is a file path, encoded image bytes, a PIL Image or an ndarray.
+    size is a square side, a (width, height) tuple, or None to keep the original resolution.
+    """
+
+    if isinstance(size, int):
+        size = (size, size)
+
+    # Arrays that are already uint8 RGB at the right size need no round trip through PIL
+    if isinstance(source, np.ndarray) and source.dtype == np.uint8 and source.ndim == 3 and source.shape[2] == 3:
+        if size is None or source.shape[1::-1] == tuple(size):
+            return source
+
+    if isinstance(source, Image.Image):
+        image = source
+    elif isinstance(source, np.ndarray):
+        image = Image.fromarray(source)
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        image = Image.open(io.BytesIO(source))
+    else:
+        image = Image.open(source)
+
+    image = image.convert('RGB')
+    if size is not None and image.size != tuple(size):
+        image = image.resize(tuple(size))
+    return np.asarray(image, dtype=np.uint8)
+
+
+def encode_png(image, compress_level=6):
+    """Encodes a uint8 RGB array as PNG bytes, compress_level 0 (fastest) to 9 (smallest)"""
+
+    buffer = io.BytesIO()
+    Image.fromarray(image).save(buffer, format='PNG', compress_level=compress_level)
+    return buffer.getvalue()
@@ -8,6 +8,7 @@ import matplotlib.pyplot as plt
 from random import randint
 import imageio
 from skimage.util.shape import view_as_blocks
+from app.models.DEEP_STEGO.Utils.preprocessing import normalize_batch, postprocess_batch
 
 '''
 Test the model on sample images (unseen)
@@ -21,22 +22,6 @@ test_images = np.load(sys.argv[1])
 model = load_model(sys.argv[2], compile=False)
 
 
-# Normalize inputs
-def normalize_batch(imgs):
-    """ Performs channel-wise z-score normalization """
-
-    return (imgs - np.array([0.485, 0.456, 0.406])) / np.array([0.229, 0.224, 0.225])
-
-
-# Denormalize outputs
-def denormalize_batch(imgs, should_clip=True):
-    imgs = (imgs * np.array([0.229, 0.224, 0.225])) + np.array([0.485, 0.456, 0.406])
-
-    if should_clip:
-        imgs = np.clip(imgs, 0, 1)
-    return imgs
-
-
 # Load images as batch (batch size -4)
 secretin = test_images[np.random.choice(len(test_images), size=4, replace=False)]
 coverin = test_images[np.random.choice(len(test_images), size=4, replace=False)]
@@ -44,15 +29,9 @@ coverin = test_images[np.random.choice(len(test_images), size=4, replace=False)]
 # Perform batch prediction
 coverout, secretout = model.predict([normalize_batch(secretin), normalize_batch(coverin)])
 
-# Postprocess cover output
-coverout = denormalize_batch(coverout)
-coverout = np.squeeze(coverout) * 255.0
-coverout = np.uint8(coverout)
-
-# Postprocess secret output
-secretout = denormalize_batch(secretout)
-secretout = np.squeeze(secretout) * 255.0
-secretout = np.uint8(secretout)
+# Postprocess outputs
+coverout = np.squeeze(postprocess_batch(coverout))
+secretout = np.squeeze(postprocess_batch(secretout))
 
 # Convert images to UINT8 format (0-255)
 coverin = np.uint8(np.squeeze(coverin * 255.0))
@@ -0,0 +1,88 @@
+import os
+import threading
+import numpy as np
+
+'''
+Alternative CPU runtimes for the DEEP_STEGO models
+Exported graphs (see export.py) run through ONNX Runtime or the TFLite interpreter without importing Keras
+'''
+
+# Resolve model paths relative to this file so cloned repos work
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+
+# keras, onnx or tflite, optionally with a quantized variant: onnx-fp16, onnx-int8, tflite-fp16, tflite-int8
+BACKEND = os.environ.get("INVISICIPHER_STEG_BACKEND", "keras")
+BACKENDS = ("keras", "onnx", "tflite")
+VARIANTS = ("", "fp16", "int8")
+
+THREADS = int(os.environ.get("INVISICIPHER_STEG_THREADS", "0")) or None
+
+
+def parse_backend(backend):
+    """Splits a backend name such as "tflite-int8" into ("tflite", "int8")"""
+
+    runtime, _, variant = backend.partition("-")
+    if runtime not in BACKENDS or variant not in VARIANTS:
+        raise ValueError("unknown steg backend: {:s}".format(backend))
+    return runtime, variant
+
+
+def model_path(name, backend):
+    """Path of the exported model file for a steg model name and backend"""
+
+    runtime, variant = parse_backend(backend)
+    extension = {"onnx": ".onnx", "tflite": ".tflite"}[runtime]
+    filename = name + ("_" + variant if variant else "") + extension
+    return os.path.join(MODELS_DIR, filename)
+
+
+class OnnxModel:
+    """Runs an exported steg model with ONNX Runtime, returns numpy arrays"""
+
+    def __init__(self, path, threads=THREADS):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [x.name for x in self.session.get_inputs()]
+
+    def __call__(self, *inputs):
+        outputs = self.session.run(None, dict(zip(self.input_names, inputs)))
+        return outputs[0] if len(outputs) == 1 else outputs
+
+
+class TFLiteModel:
+    """Runs an exported steg model with the TFLite interpreter, returns numpy arrays"""
+
+    def __init__(self, path, threads=THREADS):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+
+        self.interpreter = Interpreter(model_path=path, num_threads=threads)
+        self.runner = self.interpreter.get_signature_runner()
+        self.input_names = sorted(self.runner.get_input_details())
+        # The interpreter is stateful, so calls from several threads are serialized
+        self._lock = threading.Lock()
+
+    def __call__(self, *inputs):
+        with self._lock:
+            outputs = self.runner(**{name: np.ascontiguousarray(x) for name, x in zip(self.input_names, inputs)})
+            outputs = [np.array(outputs[key]) for key in sorted(outputs)]
+        return outputs[0] if len(outputs) == 1 else outputs
+
+
+def load_backend_model(name, backend):
+    """Loads an exported steg model for a non-Keras backend"""
+
+    path = model_path(name, backend)
+    if not os.path.exists(path):
+        raise FileNotFoundError("{:s} not found, export it first with DEEP_STEGO/export.py".format(path))
+    print("Loading {:s} model from {:s}".format(name, path))
+    if parse_backend(backend)[0] == "onnx":
+        return OnnxModel(path)
+    return TFLiteModel(path)
@@ -0,0 +1,137 @@
+import os
+import glob
+import time
+import argparse
+import numpy as np
+import tensorflow as tf
+from app.models.DEEP_STEGO.Utils.preprocessing import load_image, normalize_uint8, postprocess_batch
+from app.models.DEEP_STEGO.model_registry import MODEL_FILES, load_keras_model
+from app.models.DEEP_STEGO.inference import CompiledModel
+from app.models.DEEP_STEGO.backends import model_path, load_backend_model
+
+'''
+Export the hide/reveal models to ONNX and TFLite for CPU inference
+Optionally quantizes to fp16 or int8 (calibrated on DEEP_STEGO/test images),
+then checks parity and speed of every export against the Keras path
+'''
+
+CALIBRATION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test", "images")
+
+
+def calibration_inputs(name, calibration_dir=CALIBRATION_DIR, count=32):
+    """Normalized float32 sample inputs for a steg model, one array per model input"""
+
+    paths = sorted(glob.glob(os.path.join(calibration_dir, "*")))[:count]
+    if not paths:
+        raise FileNotFoundError("no calibration images in {:s}".format(calibration_dir))
+    images = normalize_uint8(np.stack([load_image(path) for path in paths]))
+    if name == "hide":
+        # Pair every secret with the next image as its cover
+        return [images, np.roll(images, 1, axis=0)]
+    return [images]
+
+
+def export_tflite(name, compiled, variant, inputs):
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([compiled._function.get_concrete_function()],
+                                                                compiled.model)
+    if variant == "fp16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif variant == "int8":
+        # Post-training quantization, float32 input/output so callers stay unchanged
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = lambda: ([x[i:i + 1] for x in inputs] for i in range(len(inputs[0])))
+
+    path = model_path(name, "tflite-" + variant if variant else "tflite")
+    with open(path, "wb") as f:
+        f.write(converter.convert())
+    return path
+
+
+class _CalibrationReader:
+    """Feeds calibration samples to onnxruntime's static quantizer one image at a time"""
+
+    def __init__(self, input_names, inputs):
+        self.samples = iter([{n: x[i:i + 1] for n, x in zip(input_names, inputs)} for i in range(len(inputs[0]))])
+
+    def get_next(self):
+        return next(self.samples, None)
+
+
+def export_onnx(name, compiled, variant, inputs):
+    import onnx
+    import tf2onnx
+
+    path = model_path(name, "onnx")
+    model_proto, _ = tf2onnx.convert.from_function(compiled._function, input_signature=compiled.input_signature,
+                                                   opset=13)
+    onnx.save(model_proto, path)
+    if not variant:
+        return path
+
+    quantized_path = model_path(name, "onnx-" + variant)
+    if variant == "fp16":
+        from onnxconverter_common import float16
+
+        onnx.save(float16.convert_float_to_float16(model_proto, keep_io_types=True), quantized_path)
+    else:
+        from onnxruntime.quantization import quantize_static, QuantFormat, QuantType
+
+        input_names = [x.name for x in model_proto.graph.input]
+        quantize_static(path, quantized_path, _CalibrationReader(input_names, inputs), quant_format=QuantFormat.QDQ,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+    return quantized_path
+
+
+def _timed(model, inputs, repeats):
+    model(*inputs)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        outputs = model(*inputs)
+    return outputs, (time.perf_counter() - start) / repeats
+
+
+def check(name, backend, compiled, inputs, repeats=5):
+    """Compares a backend with the Keras path, prints the uint8 error and latency per batch"""
+
+    model = load_backend_model(name, backend)
+    for batch_size in (1, len(inputs[0])):
+        batch = [x[:batch_size] for x in inputs]
+        reference, keras_time = _timed(compiled, batch, repeats)
+        outputs, backend_time = _timed(model, batch, repeats)
+        error = np.abs(postprocess_batch(reference).astype(np.int16) - postprocess_batch(outputs)).max()
+        print("{:s} {:12s} batch {:3d}: max uint8 error {:3d}, keras {:8.2f} ms, {:s} {:8.2f} ms ({:.2f}x)".format(
+            name, backend, batch_size, error, keras_time * 1000, backend, backend_time * 1000,
+            keras_time / backend_time))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the steg models to ONNX / TFLite')
+    parser.add_argument('--model', choices=list(MODEL_FILES) + ['all'], default='all')
+    parser.add_argument('--format', choices=['onnx', 'tflite', 'all'], default='all')
+    parser.add_argument('--quantize', choices=['none', 'fp16', 'int8'], default='none')
+    parser.add_argument('--calibration_dir', default=CALIBRATION_DIR)
+    parser.add_argument('--check', action='store_true', default=False, help='report parity and speed vs Keras')
+    args = parser.parse_args()
+
+    names = list(MODEL_FILES) if args.model == 'all' else [args.model]
+    formats = ['onnx', 'tflite'] if args.format == 'all' else [args.format]
+    variant = '' if args.quantize == 'none' else args.quantize
+
+    for name in names:
+        compiled = CompiledModel(load_keras_model(name))
+        inputs = calibration_inputs(name, args.calibration_dir)
+        for runtime in formats:
+            export = export_onnx if runtime == 'onnx' else export_tflite
+            print("Exported", export(name, compiled, variant, inputs))
+            if args.check:
+                check(name, runtime + "-" + variant if variant else runtime, compiled, inputs)
+
+
+if __name__ == '__main__':
+    main()
+
+'''
+Sample run (from InvisiCipher/):
+python -m app.models.DEEP_STEGO.export --format all --quantize int8 --check
+'''
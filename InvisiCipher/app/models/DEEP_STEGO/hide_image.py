@@ -1,47 +1,114 @@
 import os
+import itertools
 import numpy as np
-from tensorflow.keras.models import load_model
 from PIL import Image
 import imageio
 from tkinter import filedialog
-from app.models.DEEP_STEGO.Utils.preprocessing import normalize_batch, denormalize_batch
+from app.models.DEEP_STEGO.Utils.preprocessing import BatchBuffer, postprocess_batch, load_image, encode_png
+from app.models.DEEP_STEGO.model_registry import get_model
+from app.models.DEEP_STEGO.tiling import split_tiles, stitch_tiles, TILE_BATCH_SIZE
 
 
-def hide_image(cover_image_filepath, secret_image_filepath):
+def _hide_batch(model, cover_images, secret_images, buffers=None, out=None):
+    # Predict the steg images for uint8 cover and secret images, reusing input buffers across batches
+    secret_buffer, cover_buffer = buffers or (BatchBuffer(len(cover_images)), BatchBuffer(len(cover_images)))
+    steg_batch = model(secret_buffer.fill(secret_images), cover_buffer.fill(cover_images))
+    return postprocess_batch(steg_batch, out)
+
+
+def hide_images(pairs, batch_size=16, backend=None):
+    """Hides each secret image in its cover image, one predict call per batch
+
+    pairs is an iterable of (cover, secret), each a file path, encoded bytes, PIL Image or ndarray.
+    Yields the uint8 224x224 steg images in input order, so memory stays bounded by one batch.
+    backend selects the runtime (keras, onnx, tflite, ...), see backends.py.
+    """
+
+    # Shared per-process model, loaded on first use
+    model = get_model("hide", backend)
+
+    buffers = (BatchBuffer(batch_size), BatchBuffer(batch_size))
+    pairs = iter(pairs)
+    while True:
+        chunk = list(itertools.islice(pairs, batch_size))
+        if not chunk:
+            return
+
+        yield from _hide_batch(model, [load_image(cover) for cover, _ in chunk],
+                               [load_image(secret) for _, secret in chunk], buffers)
+
+
+def hide_array(cover_image, secret_image, backend=None):
+    """Hides a secret in a cover in memory, returns the uint8 224x224 steg image"""
+
+    return next(hide_images([(cover_image, secret_image)], batch_size=1, backend=backend))
+
+
+def hide_bytes(cover_image, secret_image, compress_level=6, backend=None):
+    """Hides a secret in a cover in memory, returns the steg image as PNG bytes"""
+
+    return encode_png(hide_array(cover_image, secret_image, backend), compress_level)
+
+
+def hide_tiles(cover_image, secret_image, overlap=0, batch_size=TILE_BATCH_SIZE, backend=None):
+    """Hides a secret in a cover at the cover's full resolution
+
+    Both uint8 HxWx3 images are split into 224x224 tiles (the secret must match the cover size),
+    the tiles run through the hide model in batches and the steg tiles are stitched back.
+    Reveal with reveal_tiles using the same overlap so the tile grid lines up.
+    """
+
+    if cover_image.shape != secret_image.shape:
+        raise ValueError("cover and secret images must have the same shape")
+
+    model = get_model("hide", backend)
+
+    cover_tiles, positions = split_tiles(cover_image, overlap=overlap)
+    secret_tiles, _ = split_tiles(secret_image, overlap=overlap)
+
+    buffers = (BatchBuffer(batch_size), BatchBuffer(batch_size))
+    steg_tiles = np.empty_like(cover_tiles)
+    for start in range(0, len(cover_tiles), batch_size):
+        end = start + batch_size
+        _hide_batch(model, cover_tiles[start:end], secret_tiles[start:end], buffers, out=steg_tiles[start:end])
+
+    return stitch_tiles(steg_tiles, positions, cover_image.shape, overlap)
+
+
+def hide_image(cover_image_filepath, secret_image_filepath, backend=None):
     # Resolve paths relative to this file so cloned repos work
     current_dir = os.path.dirname(os.path.abspath(__file__))
-    models_dir = os.path.join(current_dir, "models")
     app_dir = os.path.abspath(os.path.join(current_dir, "..", ".."))  # InvisiCipher/app
 
-    model_path = os.path.join(models_dir, "hide.h5")
-    model = load_model(model_path, compile=False)
+    print("secret image size : ", Image.open(secret_image_filepath).size)
+    print("cover image size : ", Image.open(cover_image_filepath).size)
 
-    secret_image_in = Image.open(secret_image_filepath).convert('RGB')
-    print("secret image size : ", secret_image_in.size)
-    cover_image_in = Image.open(cover_image_filepath).convert('RGB')
-    print("cover image size : ", cover_image_in.size)
+    steg_image_out = hide_array(cover_image_filepath, secret_image_filepath, backend)
 
-    # Resize if image to 224px*224px
-    if secret_image_in.size != (224, 224):
-        secret_image_in = secret_image_in.resize((224, 224))
-        print("secret_image was resized to 224px * 224px")
-    if cover_image_in.size != (224, 224):
-        cover_image_in = cover_image_in.resize((224, 224))
-        print("cover_image was resized to 224px * 224px")
+    output_path = os.path.join(app_dir, 'steg_image.png')
+    imageio.imsave(output_path, steg_image_out)
+    print("Saved steg image to", output_path)
 
-    secret_image_in = np.array(secret_image_in).reshape(1, 224, 224, 3) / 255.0
-    cover_image_in = np.array(cover_image_in).reshape(1, 224, 224, 3) / 255.0
+    return output_path
 
-    steg_image_out = model.predict([normalize_batch(secret_image_in), normalize_batch(cover_image_in)])
 
-    steg_image_out = denormalize_batch(steg_image_out)
-    steg_image_out = np.squeeze(steg_image_out) * 255.0
-    steg_image_out = np.uint8(steg_image_out)
+def hide_image_tiled(cover_image_filepath, secret_image_filepath, overlap=0, batch_size=TILE_BATCH_SIZE,
+                     backend=None):
+    # Resolve paths relative to this file so cloned repos work
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    app_dir = os.path.abspath(os.path.join(current_dir, "..", ".."))  # InvisiCipher/app
+
+    cover_image_in = load_image(cover_image_filepath, size=None)
+    height, width = cover_image_in.shape[:2]
+    print("cover image size : ", (width, height))
+
+    # The secret is stretched to the cover resolution so every cover tile carries a secret tile
+    secret_image_in = load_image(secret_image_filepath, size=(width, height))
+
+    steg_image_out = hide_tiles(cover_image_in, secret_image_in, overlap, batch_size, backend)
 
     output_path = os.path.join(app_dir, 'steg_image.png')
     imageio.imsave(output_path, steg_image_out)
     print("Saved steg image to", output_path)
 
     return output_path
-
-
@@ -0,0 +1,39 @@
+import os
+import numpy as np
+import tensorflow as tf
+
+'''
+Low latency inference for the DEEP_STEGO models
+Runs the Keras graphs as tf.functions with a fixed input signature instead of the generic predict loop
+'''
+
+# Set INVISICIPHER_STEG_JIT=1 to compile the graphs with XLA
+JIT_COMPILE = os.environ.get("INVISICIPHER_STEG_JIT", "0") == "1"
+
+
+class CompiledModel:
+    """Calls a Keras model through a traced tf.function, returns numpy arrays"""
+
+    def __init__(self, model, jit_compile=JIT_COMPILE, warmup=True):
+        self.model = model
+        # Batch dimension stays dynamic so every batch size reuses the same trace,
+        # positional names keep the input order explicit in exported ONNX/TFLite graphs
+        self.input_signature = [tf.TensorSpec((None,) + tuple(x.shape[1:]), tf.float32, name="input_{:d}".format(i))
+                                for i, x in enumerate(model.inputs)]
+        self._function = tf.function(self._forward, input_signature=self.input_signature, jit_compile=jit_compile)
+        if warmup:
+            self.warmup()
+
+    def _forward(self, *inputs):
+        return self.model(list(inputs) if len(inputs) > 1 else inputs[0], training=False)
+
+    def __call__(self, *inputs):
+        outputs = self._function(*inputs)
+        if isinstance(outputs, (list, tuple)):
+            return [output.numpy() for output in outputs]
+        return outputs.numpy()
+
+    def warmup(self, batch_size=1):
+        """Runs one dummy batch so tracing and graph optimization happen at load time"""
+
+        self(*[np.zeros((batch_size,) + tuple(spec.shape[1:]), dtype=np.float32) for spec in self.input_signature])
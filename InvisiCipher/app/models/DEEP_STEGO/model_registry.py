@@ -0,0 +1,160 @@
+import os
+import gc
+import time
+import threading
+from collections import OrderedDict
+from app.models.DEEP_STEGO.backends import BACKEND, load_backend_model
+
+'''
+Process-wide registry for the DEEP_STEGO models
+Loads each model lazily on first use and shares it across calls and threads
+'''
+
+# Resolve model paths relative to this file so cloned repos work
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+
+MODEL_FILES = {
+    "hide": "hide.h5",
+    "reveal": "reveal.h5",
+}
+
+# Defaults can be tuned per deployment without code changes
+MAX_MODELS = int(os.environ.get("INVISICIPHER_STEG_MAX_MODELS", "2"))
+IDLE_TIMEOUT = float(os.environ.get("INVISICIPHER_STEG_IDLE_TIMEOUT", "0")) or None
+
+
+def load_keras_model(name):
+    """Loads a steg model from the models directory"""
+
+    from tensorflow.keras.models import load_model
+
+    model_path = os.path.join(MODELS_DIR, MODEL_FILES[name])
+    print("Loading {:s} model from {:s}".format(name, model_path))
+    return load_model(model_path, compile=False)
+
+
+def load_compiled_model(name):
+    """Loads a steg model wrapped as a warmed up tf.function"""
+
+    from app.models.DEEP_STEGO.inference import CompiledModel
+
+    return CompiledModel(load_keras_model(name))
+
+
+def model_key(name, backend=None):
+    """Registry key of a steg model for a backend, e.g. hide or hide:onnx-int8"""
+
+    backend = backend or BACKEND
+    return name if backend == "keras" else "{:s}:{:s}".format(name, backend)
+
+
+def load_steg_model(key):
+    """Loads the model behind a registry key with the matching runtime"""
+
+    name, _, backend = key.partition(":")
+    if not backend:
+        return load_compiled_model(name)
+    return load_backend_model(name, backend)
+
+
+class ModelRegistry:
+    """Thread-safe LRU cache of loaded models with optional idle-time eviction"""
+
+    def __init__(self, loader=load_steg_model, max_models=MAX_MODELS, idle_timeout=IDLE_TIMEOUT):
+        self.loader = loader
+        self.max_models = max_models
+        self.idle_timeout = idle_timeout
+        self._models = OrderedDict()  # name -> (model, last_used)
+        self._lock = threading.RLock()
+        self._load_locks = {}
+        self._reaper = None
+
+    def get(self, name):
+        with self._lock:
+            entry = self._models.get(name)
+            if entry is not None:
+                self._models[name] = (entry[0], time.monotonic())
+                self._models.move_to_end(name)
+                return entry[0]
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        # Load outside the registry lock so cached models stay available meanwhile,
+        # the per-name lock makes concurrent callers wait for a single load
+        with load_lock:
+            with self._lock:
+                entry = self._models.get(name)
+                if entry is not None:
+                    return entry[0]
+            model = self.loader(name)
+            with self._lock:
+                self._models[name] = (model, time.monotonic())
+                self._evict_lru()
+                self._start_reaper()
+            return model
+
+    def preload(self, *names):
+        for key in names or tuple(model_key(name) for name in MODEL_FILES):
+            self.get(key)
+
+    def unload(self, *names):
+        with self._lock:
+            for name in names or tuple(self._models):
+                self._models.pop(name, None)
+        gc.collect()
+
+    def loaded(self):
+        with self._lock:
+            return list(self._models)
+
+    def evict_idle(self):
+        if not self.idle_timeout:
+            return []
+        deadline = time.monotonic() - self.idle_timeout
+        with self._lock:
+            idle = [name for name, (_, last_used) in self._models.items() if last_used < deadline]
+            for name in idle:
+                del self._models[name]
+        if idle:
+            print("Evicted idle models:", ", ".join(idle))
+            gc.collect()
+        return idle
+
+    def _evict_lru(self):
+        while self.max_models and len(self._models) > self.max_models:
+            name, _ = self._models.popitem(last=False)
+            print("Evicted least recently used model:", name)
+
+    def _start_reaper(self):
+        if not self.idle_timeout or self._reaper is not None:
+            return
+        self._reaper = threading.Thread(target=self._reap, name="steg-model-reaper", daemon=True)
+        self._reaper.start()
+
+    def _reap(self):
+        while True:
+            time.sleep(max(self.idle_timeout / 2, 1.0))
+            self.evict_idle()
+            with self._lock:
+                if not self._models:
+                    self._reaper = None
+                    return
+
+
+# Shared registry used by hide_image, reveal_image, the Qt UI and the backend
+registry = ModelRegistry()
+
+
+def get_model(name, backend=None):
+    return registry.get(model_key(name, backend))
+
+
+def preload(*names, backend=None):
+    """Loads the given models (all by default) ahead of the first request"""
+
+    registry.preload(*(model_key(name, backend) for name in names or MODEL_FILES))
+
+
+def unload(*names, backend=None):
+    """Drops the given models (all loaded by default) to give their memory back"""
+
+    registry.unload(*(model_key(name, backend) for name in names))
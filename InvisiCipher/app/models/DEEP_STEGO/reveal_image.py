@@ -1,43 +1,144 @@
 import os
+import glob
+import time
+import itertools
+import contextlib
+from collections import namedtuple
 import numpy as np
-from tensorflow.keras.models import load_model
-from PIL import Image
 import imageio
 from tkinter import filedialog
-from app.models.DEEP_STEGO.Utils.preprocessing import normalize_batch, denormalize_batch
+from app.models.DEEP_STEGO.Utils.preprocessing import BatchBuffer, postprocess_batch, load_image, encode_png
+from app.models.DEEP_STEGO.model_registry import get_model
+from app.models.DEEP_STEGO.tiling import split_tiles, stitch_tiles, TILE_BATCH_SIZE
+from app.models.pipeline import prefetch as prefetch_batches
 
+# Resolve paths relative to this file so cloned repos work
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))  # InvisiCipher/app
 
-def reveal_image(stego_image_filepath):
-    # Resolve paths relative to this file so cloned repos work
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    models_dir = os.path.join(current_dir, "models")
-    app_dir = os.path.abspath(os.path.join(current_dir, "..", ".."))  # InvisiCipher/app
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
 
-    model_path = os.path.join(models_dir, "reveal.h5")
-    model = load_model(model_path, compile=False)
+# Per-item result of reveal_images, timings are in seconds
+RevealResult = namedtuple('RevealResult', ['input_path', 'output_path', 'decode_time', 'predict_time', 'write_time'])
 
-    stego_image = Image.open(stego_image_filepath).convert('RGB')
 
-    # Resize the image to 224px*224px
-    if stego_image.size != (224, 224):
-        stego_image = stego_image.resize((224, 224))
-        print("stego_image was resized to 224px * 224px")
+def _reveal_batch(model, stego_images, buffer=None, out=None):
+    # Predict the secrets for uint8 stego images, reusing the input buffer across batches
+    buffer = buffer or BatchBuffer(len(stego_images))
+    secret_batch = model(buffer.fill(stego_images))
+    return postprocess_batch(secret_batch, out)
 
-    stego_image = np.array(stego_image).reshape(1, 224, 224, 3) / 255.0
 
-    secret_image_out = model.predict([normalize_batch(stego_image)])
+def _iter_paths(source):
+    # Accept a directory, a glob pattern or any iterable of file paths
+    if isinstance(source, (str, os.PathLike)):
+        source = os.fspath(source)
+        if os.path.isdir(source):
+            return (os.path.join(source, name) for name in sorted(os.listdir(source))
+                    if name.lower().endswith(IMAGE_EXTENSIONS))
+        return iter(sorted(glob.glob(source)))
+    return iter(source)
 
-    secret_image_out = denormalize_batch(secret_image_out)
-    secret_image_out = np.squeeze(secret_image_out) * 255.0
-    secret_image_out = np.uint8(secret_image_out)
 
-    output_path = os.path.join(app_dir, "secret_out.png")
+def _decode_batches(paths, batch_size):
+    # Runs on the prefetch thread: decode the next batches while the current one predicts
+    while True:
+        chunk = list(itertools.islice(paths, batch_size))
+        if not chunk:
+            return
+        start = time.perf_counter()
+        images = [load_image(path) for path in chunk]
+        yield chunk, images, (time.perf_counter() - start) / len(chunk)
+
+
+def _reserve_output(out_dir, input_path):
+    # Create the output file exclusively so parallel runs never overwrite each other
+    stem = os.path.splitext(os.path.basename(input_path))[0]
+    for n in itertools.count():
+        name = "{:s}_secret.png".format(stem) if n == 0 else "{:s}_secret_{:d}.png".format(stem, n)
+        output_path = os.path.join(out_dir, name)
+        try:
+            return open(output_path, 'xb'), output_path
+        except FileExistsError:
+            continue
+
+
+def reveal_images(source, batch_size=16, out_dir=None, prefetch=2, compress_level=6, backend=None):
+    """Reveals the secret images from a directory, glob pattern or iterable of stego image paths
+
+    Decoding runs on a background thread while the previous batch predicts.
+    Each secret is written under a unique name in out_dir and a RevealResult is yielded per image.
+    """
+
+    out_dir = out_dir or os.path.join(APP_DIR, "revealed")
+    os.makedirs(out_dir, exist_ok=True)
+
+    # Shared per-process model, loaded on first use
+    model = get_model("reveal", backend)
+
+    buffer = BatchBuffer(batch_size)
+    # Closing this generator early also stops the decoder thread
+    with contextlib.closing(prefetch_batches(_decode_batches(_iter_paths(source), batch_size), prefetch,
+                                             "reveal-decoder")) as batches:
+        for chunk, images, decode_time in batches:
+            start = time.perf_counter()
+            secrets = _reveal_batch(model, images, buffer)
+            predict_time = (time.perf_counter() - start) / len(chunk)
+
+            for input_path, secret in zip(chunk, secrets):
+                start = time.perf_counter()
+                f, output_path = _reserve_output(out_dir, input_path)
+                with f:
+                    f.write(encode_png(secret, compress_level))
+                write_time = time.perf_counter() - start
+                yield RevealResult(input_path, output_path, decode_time, predict_time, write_time)
+
+
+def reveal_tiles(stego_image, overlap=0, batch_size=TILE_BATCH_SIZE, backend=None):
+    """Reveals the secret from a full resolution steg image made by hide_tiles"""
+
+    model = get_model("reveal", backend)
+
+    stego_tiles, positions = split_tiles(stego_image, overlap=overlap)
+
+    buffer = BatchBuffer(batch_size)
+    secret_tiles = np.empty_like(stego_tiles)
+    for start in range(0, len(stego_tiles), batch_size):
+        end = start + batch_size
+        _reveal_batch(model, stego_tiles[start:end], buffer, out=secret_tiles[start:end])
+
+    return stitch_tiles(secret_tiles, positions, stego_image.shape, overlap)
+
+
+def reveal_array(stego_image, backend=None):
+    """Reveals the secret in memory, stego_image is a file path, encoded bytes, PIL Image or ndarray"""
+
+    # Shared per-process model, loaded on first use
+    model = get_model("reveal", backend)
+
+    return _reveal_batch(model, [load_image(stego_image)])[0]
+
+
+def reveal_bytes(stego_image, compress_level=6, backend=None):
+    """Reveals the secret in memory, returns it as PNG bytes"""
+
+    return encode_png(reveal_array(stego_image, backend), compress_level)
+
+
+def reveal_image(stego_image_filepath, backend=None):
+    secret_image_out = reveal_array(stego_image_filepath, backend)
+
+    output_path = os.path.join(APP_DIR, "secret_out.png")
     imageio.imsave(output_path, secret_image_out)
     print("Saved revealed image to", output_path)
 
     return output_path
 
 
+def reveal_image_tiled(stego_image_filepath, overlap=0, batch_size=TILE_BATCH_SIZE, backend=None):
+    secret_image_out = reveal_tiles(load_image(stego_image_filepath, size=None), overlap, batch_size, backend)
 
+    output_path = os.path.join(APP_DIR, "secret_out.png")
+    imageio.imsave(output_path, secret_image_out)
+    print("Saved revealed image to", output_path)
 
-
+    return output_path
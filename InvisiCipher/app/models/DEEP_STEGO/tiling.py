@@ -0,0 +1,72 @@
+import os
+import math
+import numpy as np
+
+'''
+Split full resolution images into model sized tiles and stitch them back
+'''
+
+TILE_SIZE = 224
+
+# Tiles per predict call, scaled with the cores available to the op thread pools
+TILE_BATCH_SIZE = max(4, os.cpu_count() or 1)
+
+
+def _grid(length, tile, overlap):
+    # Tile origins along one axis and the padded length they cover
+    stride = tile - overlap
+    count = max(1, math.ceil((length - tile) / stride) + 1)
+    return [i * stride for i in range(count)], (count - 1) * stride + tile
+
+
+def split_tiles(image, tile=TILE_SIZE, overlap=0):
+    """Splits an HxWx3 image into tile x tile patches, edge padding the borders
+
+    Returns the stacked tiles and their (y, x) origins in the padded image.
+    """
+
+    if not 0 <= overlap < tile:
+        raise ValueError("overlap must be in [0, {:d})".format(tile))
+
+    height, width = image.shape[:2]
+    ys, padded_height = _grid(height, tile, overlap)
+    xs, padded_width = _grid(width, tile, overlap)
+    padded = np.pad(image, ((0, padded_height - height), (0, padded_width - width), (0, 0)), mode='edge')
+
+    positions = [(y, x) for y in ys for x in xs]
+    tiles = np.stack([padded[y:y + tile, x:x + tile] for y, x in positions])
+    return tiles, positions
+
+
+def _blend_weights(tile, overlap):
+    # Linear ramp over the overlap on every side so neighbouring tiles fade into each other
+    ramp = np.ones(tile, dtype=np.float32)
+    if overlap:
+        edge = np.arange(1, overlap + 1, dtype=np.float32) / (overlap + 1)
+        ramp[:overlap] = edge
+        ramp[-overlap:] = edge[::-1]
+    return np.outer(ramp, ramp)[:, :, None]
+
+
+def stitch_tiles(tiles, positions, shape, overlap=0):
+    """Stitches tiles from split_tiles back into a uint8 image of the given (height, width)"""
+
+    tile = tiles.shape[1]
+    height, width = shape[:2]
+    padded_height = max(y for y, _ in positions) + tile
+    padded_width = max(x for _, x in positions) + tile
+
+    if not overlap:
+        out = np.empty((padded_height, padded_width, tiles.shape[3]), dtype=np.uint8)
+        for (y, x), patch in zip(positions, tiles):
+            out[y:y + tile, x:x + tile] = patch
+        return out[:height, :width]
+
+    weights = _blend_weights(tile, overlap)
+    acc = np.zeros((padded_height, padded_width, tiles.shape[3]), dtype=np.float32)
+    weight_sum = np.zeros((padded_height, padded_width, 1), dtype=np.float32)
+    for (y, x), patch in zip(positions, tiles):
+        acc[y:y + tile, x:x + tile] += patch * weights
+        weight_sum[y:y + tile, x:x + tile] += weights
+    acc /= weight_sum
+    return np.uint8(np.clip(np.rint(acc[:height, :width]), 0, 255))
@@ -17,7 +17,7 @@ import matplotlib.pyplot as plt
 from random import randint
 import imageio
 from io import StringIO, BytesIO
-from app.models.DEEP_STEGO.Utils.preprocessing import normalize_batch, denormalize_batch
+from app.models.DEEP_STEGO.Utils.preprocessing import normalize_batch, postprocess_batch
 from app.models.DEEP_STEGO.Utils.customLossWeight import custom_loss_1, custom_loss_2
 
 tf.compat.v1.disable_v2_behavior()
@@ -236,15 +236,9 @@ class TensorBoardImage(Callback):
         # Predict on batch
         cover_out, secret_out = model.predict([normalize_batch(secret_in), normalize_batch(cover_in)])
 
-        # Post process output cover image
-        cover_out = denormalize_batch(cover_out)
-        cover_out = np.squeeze(cover_out) * 255.0
-        cover_out = np.uint8(cover_out)
-
-        # Post process output secret image
-        secret_out = denormalize_batch(secret_out)
-        secret_out = np.squeeze(secret_out) * 255.0
-        secret_out = np.uint8(secret_out)
+        # Post process output images
+        cover_out = np.squeeze(postprocess_batch(cover_out))
+        secret_out = np.squeeze(postprocess_batch(secret_out))
 
         # Convert images to UINT8 format (0-255)
         cover_in = np.uint8(np.squeeze(cover_in * 255.0))
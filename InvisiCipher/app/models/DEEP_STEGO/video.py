@@ -0,0 +1,121 @@
+import time
+import cv2
+from app.models.DEEP_STEGO.Utils.preprocessing import BatchBuffer
+from app.models.DEEP_STEGO.model_registry import get_model
+from app.models.DEEP_STEGO.hide_image import _hide_batch
+from app.models.DEEP_STEGO.reveal_image import _reveal_batch
+from app.models.pipeline import run_pipeline
+
+'''
+Streaming video steganography
+A reader thread decodes frames, the main thread predicts whole batches and a writer thread encodes
+(app.models.pipeline), connected by bounded queues so memory stays constant for any video length
+'''
+
+FRAME_SIZE = 224
+
+# Lossless by default, lossy codecs such as MJPG destroy the hidden secret
+DEFAULT_FOURCC = 'FFV1'
+
+
+def _read_frame(capture):
+    # Next frame as a 224x224 RGB uint8 array, None at the end of the video
+    success, frame = capture.read()
+    if not success:
+        return None
+    frame = cv2.resize(frame, (FRAME_SIZE, FRAME_SIZE), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+
+def _batches(captures, batch_size):
+    # Groups frames (one per capture) into batches until the shortest video ends
+    batch = []
+    while True:
+        frames = [_read_frame(capture) for capture in captures]
+        if any(frame is None for frame in frames):
+            break
+        batch.append(frames)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _run(captures, output_path, fps, predict, batch_size, queue_size, fourcc):
+    writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*fourcc), fps, (FRAME_SIZE, FRAME_SIZE))
+    if not writer.isOpened():
+        raise IOError("could not open {:s} for writing with codec {:s}".format(output_path, fourcc))
+
+    count = 0
+    start = time.perf_counter()
+
+    def step(batch):
+        nonlocal count
+        frames = predict(batch)
+        count += len(batch)
+        elapsed = time.perf_counter() - start
+        print("\rProcessed {:d} frames ({:.1f} frames/sec)".format(count, count / elapsed), end="")
+        return frames
+
+    def write(frames):
+        for frame in frames:
+            writer.write(cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+
+    try:
+        run_pipeline(_batches(captures, batch_size), step, write, queue_size, name="video")
+    finally:
+        writer.release()
+        for capture in captures:
+            capture.release()
+
+    elapsed = time.perf_counter() - start
+    stats = {"frames": count, "seconds": elapsed, "fps": count / elapsed if elapsed else 0.0}
+    print("\nWrote {:s}: {:d} frames in {:.1f}s ({:.1f} frames/sec)".format(output_path, count, elapsed, stats["fps"]))
+    return stats
+
+
+def _open(video_path):
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        raise IOError("could not open video {:s}".format(video_path))
+    return capture
+
+
+def hide_video(cover_video_path, secret_video_path, output_path, batch_size=8, queue_size=4,
+               fourcc=DEFAULT_FOURCC, backend=None):
+    """Hides a secret video frame by frame in a cover video, returns frame count, seconds and fps
+
+    Stops at the end of the shorter video. The steg video is written at 224x224 and the cover frame rate.
+    """
+
+    model = get_model("hide", backend)
+    buffers = (BatchBuffer(batch_size), BatchBuffer(batch_size))
+    cover, secret = _open(cover_video_path), _open(secret_video_path)
+    fps = cover.get(cv2.CAP_PROP_FPS) or 25.0
+
+    def predict(batch):
+        return _hide_batch(model, [frames[0] for frames in batch], [frames[1] for frames in batch], buffers)
+
+    return _run([cover, secret], output_path, fps, predict, batch_size, queue_size, fourcc)
+
+
+def reveal_video(stego_video_path, output_path, batch_size=8, queue_size=4, fourcc=DEFAULT_FOURCC, backend=None):
+    """Reveals the secret video from a steg video made by hide_video, returns frame count, seconds and fps"""
+
+    model = get_model("reveal", backend)
+    buffer = BatchBuffer(batch_size)
+    stego = _open(stego_video_path)
+    fps = stego.get(cv2.CAP_PROP_FPS) or 25.0
+
+    def predict(batch):
+        return _reveal_batch(model, [frames[0] for frames in batch], buffer)
+
+    return _run([stego], output_path, fps, predict, batch_size, queue_size, fourcc)
+
+
+'''
+Sample usage:
+hide_video('cover.mp4', 'secret.mp4', 'results/steg_video.avi')
+reveal_video('results/steg_video.avi', 'results/secret_outvid.avi')
+'''
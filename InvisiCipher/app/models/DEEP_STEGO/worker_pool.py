@@ -0,0 +1,295 @@
+import os
+import queue
+import itertools
+import threading
+import traceback
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future
+
+'''
+Multi-process executor for the DEEP_STEGO operations
+Every worker process owns a preloaded model and a pinned op thread count,
+tasks are spread over the workers and crashed workers are restarted
+'''
+
+OPERATIONS = ("hide", "reveal")
+
+
+class WorkerCrashedError(RuntimeError):
+    """Raised for a task whose worker process died while running it"""
+
+
+class TaskError(RuntimeError):
+    """Raised for a task that failed inside a worker, carries the worker traceback"""
+
+
+def _run(op, items, backend):
+    # Runs one chunk of items through the batched hide/reveal path of this worker
+    if op == "hide":
+        from app.models.DEEP_STEGO.hide_image import hide_images
+
+        return list(hide_images(items, batch_size=len(items), backend=backend))
+
+    from app.models.DEEP_STEGO.reveal_image import _reveal_batch
+    from app.models.DEEP_STEGO.Utils.preprocessing import load_image
+    from app.models.DEEP_STEGO.model_registry import get_model
+
+    return list(_reveal_batch(get_model("reveal", backend), [load_image(item) for item in items]))
+
+
+def _worker_main(slot, tasks, results, threads, models, backend):
+    # Pin the op thread pools before any runtime is imported in this process
+    for var in ("OMP_NUM_THREADS", "TF_NUM_INTRAOP_THREADS", "INVISICIPHER_STEG_THREADS"):
+        os.environ[var] = str(threads)
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+
+    from app.models.DEEP_STEGO import model_registry
+
+    if (backend or model_registry.BACKEND) == "keras":
+        import tensorflow as tf
+
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+    if models:
+        model_registry.preload(*models, backend=backend)
+    results.put(("ready", slot, os.getpid()))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        task_id, op, items = task
+        try:
+            results.put(("done", slot, task_id, _run(op, items, backend)))
+        except Exception as e:
+            results.put(("error", slot, task_id, repr(e), traceback.format_exc()))
+
+
+class _Worker:
+    def __init__(self, process, tasks):
+        self.process = process
+        self.tasks = tasks
+        self.task_id = None  # task currently assigned to this worker
+        self.crashes = 0  # consecutive crashes, reset once a worker comes up
+
+
+class StegWorkerPool:
+    """Spreads hide/reveal tasks over worker processes, results come back in submission order
+
+    A failing task only fails its own future, a worker that dies is restarted and its task fails
+    with WorkerCrashedError.
+    """
+
+    def __init__(self, workers=None, threads_per_worker=None, models=OPERATIONS, backend=None, max_restarts=5):
+        cpus = os.cpu_count() or 1
+        self.size = workers or cpus
+        self.threads_per_worker = threads_per_worker or max(1, cpus // self.size)
+        self.models = tuple(models)
+        self.backend = backend
+        self.max_restarts = max_restarts
+
+        # Spawned workers, TensorFlow is not fork safe
+        self._context = multiprocessing.get_context("spawn")
+        self._results = self._context.Queue()
+        self._lock = threading.Lock()
+        self._pending = deque()  # (task_id, op, items) waiting for an idle worker
+        self._futures = {}
+        self._task_ids = itertools.count()
+        self._closed = False
+
+        self._workers = [self._start_worker(slot) for slot in range(self.size)]
+        self._collector = threading.Thread(target=self._collect, name="steg-pool-collector", daemon=True)
+        self._collector.start()
+
+    def _start_worker(self, slot, crashes=0):
+        tasks = self._context.Queue()
+        process = self._context.Process(target=_worker_main, name="steg-worker-{:d}".format(slot), daemon=True,
+                                        args=(slot, tasks, self._results, self.threads_per_worker, self.models,
+                                              self.backend))
+        process.start()
+        worker = _Worker(process, tasks)
+        worker.crashes = crashes
+        return worker
+
+    def submit(self, op, items):
+        """Queues a list of items for one worker, returns a Future of the list of uint8 results"""
+
+        if op not in OPERATIONS:
+            raise ValueError("unknown operation: {:s}".format(op))
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("worker pool is closed")
+            task_id = next(self._task_ids)
+            self._futures[task_id] = future
+            self._pending.append((task_id, op, list(items)))
+            self._dispatch()
+        return future
+
+    def map(self, op, items, chunksize=8, return_exceptions=False):
+        """Runs op over items, yields one result per item in input order
+
+        Items are sent in chunks of chunksize so every worker predicts whole batches.
+        With return_exceptions the exception of a failed chunk is yielded for each of its items instead of raised.
+        """
+
+        items = iter(items)
+        futures = deque()
+        window = 2 * self.size
+        while True:
+            # Keep a bounded number of chunks in flight so memory does not grow with the input
+            while len(futures) < window:
+                chunk = list(itertools.islice(items, chunksize))
+                if not chunk:
+                    break
+                futures.append((len(chunk), self.submit(op, chunk)))
+            if not futures:
+                return
+            count, future = futures.popleft()
+            try:
+                yield from future.result()
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                yield from itertools.repeat(e, count)
+
+    def hide(self, pairs, chunksize=8, return_exceptions=False):
+        return self.map("hide", pairs, chunksize, return_exceptions)
+
+    def reveal(self, stego_images, chunksize=8, return_exceptions=False):
+        return self.map("reveal", stego_images, chunksize, return_exceptions)
+
+    def _dispatch(self):
+        # Hand pending tasks to idle workers, caller holds the lock
+        for worker in self._workers:
+            if not self._pending:
+                return
+            if worker.task_id is None and worker.process.is_alive():
+                task = self._pending.popleft()
+                worker.task_id = task[0]
+                worker.tasks.put(task)
+
+    def _finish(self, slot, task_id, result=None, error=None):
+        with self._lock:
+            worker = self._workers[slot]
+            if worker.task_id == task_id:
+                worker.task_id = None
+            future = self._futures.pop(task_id, None)
+            self._dispatch()
+        if future is None:
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _collect(self):
+        while True:
+            try:
+                message = self._results.get(timeout=0.5)
+            except queue.Empty:
+                message = None
+            except (EOFError, OSError):
+                return
+
+            if message is not None:
+                self._handle(message)
+
+            with self._lock:
+                if self._closed:
+                    return
+            self._restart_crashed()
+
+    def _handle(self, message):
+        kind, slot = message[0], message[1]
+        if kind == "ready":
+            with self._lock:
+                self._workers[slot].crashes = 0
+            print("Steg worker {:d} ready (pid {:d})".format(slot, message[2]))
+        elif kind == "done":
+            self._finish(slot, message[2], result=message[3])
+        elif kind == "error":
+            self._finish(slot, message[2], error=TaskError("{:s}\n{:s}".format(message[3], message[4])))
+
+    def _drain_results(self):
+        # Handle everything already posted, a worker may report its task just before it dies
+        while True:
+            try:
+                message = self._results.get_nowait()
+            except queue.Empty:
+                return
+            except (EOFError, OSError):
+                return
+            self._handle(message)
+
+    def _restart_crashed(self):
+        if any(not worker.process.is_alive() and worker.crashes <= self.max_restarts for worker in self._workers):
+            self._drain_results()
+        for slot, worker in enumerate(self._workers):
+            if worker.process.is_alive() or worker.crashes > self.max_restarts:
+                continue
+            with self._lock:
+                if self._closed:
+                    return
+                task_id = worker.task_id
+                exitcode = worker.process.exitcode
+                # Nobody reads this queue any more, do not block interpreter exit flushing it
+                worker.tasks.cancel_join_thread()
+                if worker.crashes < self.max_restarts:
+                    print("Steg worker {:d} exited with code {}, restarting".format(slot, exitcode))
+                    self._workers[slot] = self._start_worker(slot, worker.crashes + 1)
+                    # Queued tasks would otherwise wait for the next submit
+                    self._dispatch()
+                else:
+                    # Keeps crashing on startup, leave the slot empty instead of spinning
+                    print("Steg worker {:d} exited with code {}, giving up after {:d} restarts".format(
+                        slot, exitcode, self.max_restarts))
+                    worker.crashes += 1
+                    worker.task_id = None
+            if task_id is not None:
+                self._finish(slot, task_id, error=WorkerCrashedError(
+                    "worker {:d} exited with code {} while running the task".format(slot, exitcode)))
+
+        with self._lock:
+            if any(worker.crashes <= self.max_restarts for worker in self._workers):
+                return
+            failed = [self._futures.pop(task_id) for task_id, _, _ in self._pending]
+            self._pending.clear()
+        for future in failed:
+            future.set_exception(WorkerCrashedError("no steg worker could be started"))
+
+    def close(self, timeout=10):
+        """Stops the workers, tasks that have not finished fail with RuntimeError"""
+
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            futures = list(self._futures.values())
+            self._futures.clear()
+            self._pending.clear()
+        for worker in self._workers:
+            worker.tasks.put(None)
+        for worker in self._workers:
+            worker.process.join(timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.tasks.cancel_join_thread()
+        for future in futures:
+            if not future.done():
+                future.set_exception(RuntimeError("worker pool closed"))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+'''
+Sample usage:
+with StegWorkerPool(workers=8) as pool:
+    for steg_image in pool.hide(zip(cover_paths, secret_paths)):
+        ...
+'''
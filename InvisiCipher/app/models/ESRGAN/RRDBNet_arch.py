@@ -34,14 +34,76 @@ class ResidualDenseBlock_5C(nn.Module):
         return x5 * 0.2 + x
 
 
+class DenseFeatureBuffer:
+    """Scratch tensor shared by the buffered dense blocks of one network
+
+    Blocks run one after another and one sample at a time, so a single (1, channels, H, W) buffer serves
+    all of them. It is only reallocated when the input changes shape, which also makes the network unsafe
+    to call from several threads at once.
+    """
+
+    def __init__(self):
+        self.tensor = None
+
+    def get(self, like, channels):
+        _, _, h, w = like.shape
+        t = self.tensor
+        if t is None or t.shape[1:] != (channels, h, w) or t.dtype != like.dtype or t.device != like.device:
+            t = self.tensor = like.new_empty(1, channels, h, w)
+        return t
+
+
+class ResidualDenseBlock_5C_Buffered(ResidualDenseBlock_5C):
+    """Inference version of ResidualDenseBlock_5C with the same parameters
+
+    Each conv output is written into its channel slice of one nf + 4 * gc buffer instead of concatenating
+    a growing feature tensor four times. Batches run one sample at a time: with a batch dimension the
+    channel slices are not contiguous and every conv would copy its input again.
+    Outside inference mode it falls back to the torch.cat path.
+    """
+
+    def __init__(self, nf=64, gc=32, bias=True, buffer=None):
+        super(ResidualDenseBlock_5C_Buffered, self).__init__(nf, gc, bias)
+        self.nf, self.gc = nf, gc
+        self.buffer = buffer or DenseFeatureBuffer()
+
+    def forward(self, x):
+        if not torch.is_inference_mode_enabled():
+            return super(ResidualDenseBlock_5C_Buffered, self).forward(x)
+        if x.shape[0] == 1:
+            return self._forward_sample(x)
+        out = None
+        for i in range(x.shape[0]):
+            result = self._forward_sample(x[i:i + 1])
+            if out is None:
+                # Result dtype can differ from x under autocast
+                out = result.new_empty((x.shape[0],) + result.shape[1:])
+            out[i:i + 1] = result
+        return out
+
+    def _forward_sample(self, x):
+        nf, gc = self.nf, self.gc
+        features = self.buffer.get(x, nf + 4 * gc)
+        features[:, :nf] = x
+        for i, conv in enumerate((self.conv1, self.conv2, self.conv3, self.conv4)):
+            features[:, nf + i * gc:nf + (i + 1) * gc] = self.lrelu(conv(features[:, :nf + i * gc]))
+        x5 = self.conv5(features)
+        return x5 * 0.2 + x
+
+
 class RRDB(nn.Module):
     """Residual in Residual Dense Block"""
 
-    def __init__(self, nf, gc=32):
+    def __init__(self, nf, gc=32, buffer=None):
         super(RRDB, self).__init__()
-        self.RDB1 = ResidualDenseBlock_5C(nf, gc)
-        self.RDB2 = ResidualDenseBlock_5C(nf, gc)
-        self.RDB3 = ResidualDenseBlock_5C(nf, gc)
+        if buffer is None:
+            self.RDB1 = ResidualDenseBlock_5C(nf, gc)
+            self.RDB2 = ResidualDenseBlock_5C(nf, gc)
+            self.RDB3 = ResidualDenseBlock_5C(nf, gc)
+        else:
+            self.RDB1 = ResidualDenseBlock_5C_Buffered(nf, gc, buffer=buffer)
+            self.RDB2 = ResidualDenseBlock_5C_Buffered(nf, gc, buffer=buffer)
+            self.RDB3 = ResidualDenseBlock_5C_Buffered(nf, gc, buffer=buffer)
 
     def forward(self, x):
         out = self.RDB1(x)
@@ -51,9 +113,10 @@ class RRDB(nn.Module):
 
 
 class RRDBNet(nn.Module):
-    def __init__(self, in_nc, out_nc, nf, nb, gc=32):
+    def __init__(self, in_nc, out_nc, nf, nb, gc=32, dense_buffer=False):
         super(RRDBNet, self).__init__()
-        RRDB_block_f = functools.partial(RRDB, nf=nf, gc=gc)
+        # dense_buffer: inference-only dense blocks sharing one preallocated feature buffer, same state dict
+        RRDB_block_f = functools.partial(RRDB, nf=nf, gc=gc, buffer=DenseFeatureBuffer() if dense_buffer else None)
 
         self.conv_first = nn.Conv2d(in_nc, nf, 3, 1, 1, bias=True)
         self.RRDB_trunk = make_layer(RRDB_block_f, nb)
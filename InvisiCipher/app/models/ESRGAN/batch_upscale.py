@@ -0,0 +1,141 @@
+import os
+import glob
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import torch
+from torch.utils.data import Dataset, DataLoader
+from app.models.ESRGAN.service import get_service, bgr_to_tensor, tensor_to_bgr, DEFAULT_MODEL_PATH, SCALE
+from app.models.ESRGAN.tiling import TILE_SIZE, TILE_OVERLAP, TILE_BATCH_SIZE
+
+'''
+Batch upscaling of a directory of images
+Worker processes decode ahead of the model, same-size images share a forward pass,
+large images go through the tiled engine and PNG encoding/writes run on a thread pool
+'''
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp")
+
+
+class ImageFolder(Dataset):
+    """Decodes images to (3, H, W) RGB float tensors inside the DataLoader workers"""
+
+    def __init__(self, paths):
+        self.paths = paths
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, index):
+        image = cv2.imread(self.paths[index], cv2.IMREAD_COLOR)
+        if image is None:
+            raise IOError("could not read {:s}".format(self.paths[index]))
+        return self.paths[index], bgr_to_tensor(image)
+
+
+def _init_worker(_):
+    # One decode per worker process, cv2's own thread pool would oversubscribe the cores
+    cv2.setNumThreads(1)
+    torch.set_num_threads(1)
+
+
+def list_images(source):
+    """Image paths of a directory or glob pattern, sorted"""
+
+    pattern = os.path.join(source, "*") if os.path.isdir(source) else source
+    return sorted(path for path in glob.glob(pattern) if path.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def upscale_directory(source, output_dir, batch_size=4, workers=2, writers=2, tile_size=TILE_SIZE,
+                      overlap=TILE_OVERLAP, model_path=DEFAULT_MODEL_PATH):
+    """Upscales every image of a directory or glob into output_dir as <name>_rlt.png
+
+    Images up to tile_size x tile_size are grouped by size into batches of up to batch_size, larger ones are tiled.
+    At most batch_size small images wait for a batch, so memory stays bounded for directories of mixed sizes.
+    Returns the image count, input megapixels and seconds.
+    """
+
+    paths = list_images(source)
+    if not paths:
+        raise FileNotFoundError("no images in {:s}".format(source))
+    os.makedirs(output_dir, exist_ok=True)
+    service = get_service(model_path)
+
+    loader = DataLoader(ImageFolder(paths), batch_size=None, num_workers=workers, worker_init_fn=_init_worker,
+                        prefetch_factor=2 * batch_size if workers else None)
+    writer = ThreadPoolExecutor(max_workers=writers, thread_name_prefix="upscale-writer")
+    writes = deque()
+    groups = {}  # (H, W) -> [(path, image), ...] waiting for a batch
+    pending = 0
+    count, megapixels = 0, 0.0
+
+    def write(path, image_high_res):
+        base = os.path.splitext(os.path.basename(path))[0]
+        output_path = os.path.join(output_dir, "{:s}_rlt.png".format(base))
+        if not cv2.imwrite(output_path, tensor_to_bgr(image_high_res)):
+            raise IOError("could not write {:s}".format(output_path))
+
+    def run(items, tiled):
+        nonlocal count, megapixels
+        batch = torch.stack([image for _, image in items])
+        outputs = service.upscale_tensor(batch, tile_size if tiled else None, overlap, TILE_BATCH_SIZE)
+        for (path, image), output in zip(items, outputs):
+            writes.append(writer.submit(write, path, output))
+            count += 1
+            megapixels += image.shape[1] * image.shape[2] / 1e6
+        # Bound the results waiting for the writers, surfacing write errors in order
+        while len(writes) > 2 * writers:
+            writes.popleft().result()
+        elapsed = time.perf_counter() - start
+        print("\rUpscaled {:d}/{:d} images ({:.2f} images/sec)".format(count, len(paths), count / elapsed), end="")
+
+    start = time.perf_counter()
+    try:
+        for path, image in loader:
+            height, width = image.shape[1:]
+            if height * width > tile_size * tile_size:
+                run([(path, image)], tiled=True)
+                continue
+            groups.setdefault((height, width), []).append((path, image))
+            pending += 1
+            if pending == batch_size:
+                # Run the largest pending group, the others keep collecting
+                largest = max(groups, key=lambda size: len(groups[size]))
+                group = groups.pop(largest)
+                pending -= len(group)
+                run(group, tiled=False)
+        for group in groups.values():
+            run(group, tiled=False)
+        while writes:
+            writes.popleft().result()
+    finally:
+        writer.shutdown(wait=True)
+
+    elapsed = time.perf_counter() - start
+    print("\nUpscaled {:d} images ({:.2f} MP in, {:.2f} MP out) in {:.1f}s: {:.2f} images/sec, {:.3f} MP/sec in".format(
+        count, megapixels, megapixels * SCALE * SCALE, elapsed, count / elapsed, megapixels / elapsed))
+    return {"images": count, "megapixels": megapixels, "seconds": elapsed}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Upscale every image of a directory with ESRGAN')
+    parser.add_argument('--input', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "LR"),
+                        help='directory or glob of low resolution images')
+    parser.add_argument('--output', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "results"))
+    parser.add_argument('--model_path', default=DEFAULT_MODEL_PATH)
+    parser.add_argument('--batch_size', type=int, default=4, help='same-size images per forward pass')
+    parser.add_argument('--workers', type=int, default=2, help='decode worker processes, 0 decodes inline')
+    parser.add_argument('--writers', type=int, default=2, help='PNG encode/write threads')
+    parser.add_argument('--tile_size', type=int, default=TILE_SIZE, help='larger images are upscaled in tiles')
+    parser.add_argument('--overlap', type=int, default=TILE_OVERLAP)
+    args = parser.parse_args()
+
+    upscale_directory(args.input, args.output, args.batch_size, args.workers, args.writers, args.tile_size,
+                      args.overlap, args.model_path)
+
+'''
+Sample run (from InvisiCipher/):
+python -m app.models.ESRGAN.batch_upscale --input app/models/ESRGAN/LR --output app/models/ESRGAN/results
+'''
@@ -0,0 +1,60 @@
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+'''
+Cold start of the ESRGAN service per weights format
+Every run is a fresh process, it reports the time to a ready service and the resident memory split into
+private (anonymous) pages and file-backed pages that other worker processes share through the page cache
+'''
+
+
+def _rss():
+    # RssAnon is private to the process, RssFile can be shared with every process mapping the same file
+    with open('/proc/self/status') as f:
+        fields = dict(line.split(':', 1) for line in f)
+    return {key: int(fields[key].split()[0]) / 1024 for key in ("RssAnon", "RssFile")}
+
+
+def _child(model_path):
+    start = time.perf_counter()
+    import torch
+    from app.models.ESRGAN.service import ESRGANService
+
+    imported = time.perf_counter()
+    service = ESRGANService(model_path, 'cpu')
+    loaded = time.perf_counter()
+    with torch.inference_mode():
+        service.forward(torch.rand(1, 3, 16, 16))
+    first = time.perf_counter()
+    print(json.dumps(dict(_rss(), imports=imported - start, load=loaded - imported, first_call=first - loaded)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Measure ESRGAN service cold start for several weights files')
+    parser.add_argument('model_paths', nargs='+', help='e.g. RRDB_ESRGAN_x4.pth RRDB_ESRGAN_x4.safetensors')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.model_paths[0])
+        sys.exit(0)
+
+    for path in args.model_paths:
+        runs = []
+        for _ in range(args.runs):
+            output = subprocess.run([sys.executable, "-m", "app.models.ESRGAN.benchmarks.cold_start", "--child", path],
+                                    capture_output=True, text=True, check=True).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+        mean = {key: sum(run[key] for run in runs) / len(runs) for key in runs[0]}
+        print("{:s}\n  load {:6.3f}s  first call {:6.3f}s  private RSS {:6.1f} MB  shared file RSS {:6.1f} MB".format(
+            path, mean["load"], mean["first_call"], mean["RssAnon"], mean["RssFile"]))
+
+'''
+Sample run (from InvisiCipher/):
+python -m app.models.ESRGAN.benchmarks.cold_start app/models/ESRGAN/models/RRDB_ESRGAN_x4.pth \
+    app/models/ESRGAN/models/RRDB_ESRGAN_x4.safetensors
+'''
@@ -0,0 +1,38 @@
+import time
+import cv2
+import numpy as np
+
+'''
+Shared helpers for the ESRGAN benchmarks
+'''
+
+
+def load_input(image_filepath, size=None):
+    """Reads a BGR uint8 benchmark input, optionally center cropped to size x size"""
+
+    image = cv2.imread(image_filepath, cv2.IMREAD_COLOR)
+    if image is None:
+        raise IOError("could not read {:s}".format(image_filepath))
+    if size:
+        height, width = image.shape[:2]
+        y, x = max(0, (height - size) // 2), max(0, (width - size) // 2)
+        image = np.ascontiguousarray(image[y:y + size, x:x + size])
+    return image
+
+
+def psnr(reference, image):
+    """Peak signal-to-noise ratio in dB between two uint8 images"""
+
+    mse = np.mean((reference.astype(np.float64) - image.astype(np.float64)) ** 2)
+    return float('inf') if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
+
+
+def timed(fn, repeats=3, warmup=1):
+    """Runs fn warmup + repeats times, returns the last result and the mean seconds per timed run"""
+
+    for _ in range(warmup):
+        result = fn()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = fn()
+    return result, (time.perf_counter() - start) / repeats
@@ -0,0 +1,55 @@
+import argparse
+import torch
+from torch.profiler import profile, ProfilerActivity
+from app.models.ESRGAN import RRDBNet_arch as arch
+from app.models.ESRGAN.benchmarks.common import timed
+
+'''
+Microbenchmark of the torch.cat dense block against the preallocated buffer version
+Reports time per forward pass, bytes allocated and the number of cat calls, for one block and for RRDBNet,
+at batch size 1 and at the batch sizes the tiler and batch_upscale run with
+'''
+
+parser = argparse.ArgumentParser(description='Compare ResidualDenseBlock_5C with its buffered version')
+parser.add_argument('--size', type=int, default=96, help='input tile size')
+parser.add_argument('--batch_sizes', type=lambda value: [int(n) for n in value.split(',')], default=[1, 2, 4],
+                    help='comma separated batch sizes')
+parser.add_argument('--blocks', type=int, default=23, help='RRDB blocks of the full network')
+parser.add_argument('--repeats', type=int, default=5)
+args = parser.parse_args()
+
+
+def allocations(module, x):
+    # CPU bytes allocated and aten::cat calls during one forward pass
+    with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as prof:
+        module(x)
+    events = prof.key_averages()
+    allocated = sum(max(0, event.self_cpu_memory_usage) for event in events)
+    cats = sum(event.count for event in events if event.key == "aten::cat")
+    return allocated, cats
+
+
+def compare(name, reference, buffered, x):
+    buffered.load_state_dict(reference.state_dict(), strict=True)
+    with torch.inference_mode():
+        difference = (reference(x) - buffered(x)).abs().max().item()
+        for label, module in (("cat", reference), ("buffered", buffered)):
+            _, seconds = timed(lambda: module(x), args.repeats)
+            allocated, cats = allocations(module, x)
+            print("{:10s} {:9s} {:9.2f} ms  {:9.1f} MB allocated  {:4d} cat calls".format(
+                name, label, seconds * 1000, allocated / 2 ** 20, cats))
+    print("{:10s} max abs diff {:.2e}".format(name, difference))
+
+
+block, block_buffered = arch.ResidualDenseBlock_5C(64, 32).eval(), arch.ResidualDenseBlock_5C_Buffered(64, 32).eval()
+net = arch.RRDBNet(3, 3, 64, args.blocks, gc=32).eval()
+net_buffered = arch.RRDBNet(3, 3, 64, args.blocks, gc=32, dense_buffer=True).eval()
+for batch_size in args.batch_sizes:
+    print("batch size {:d}".format(batch_size))
+    compare("block", block, block_buffered, torch.rand(batch_size, 64, args.size, args.size))
+    compare("RRDBNet", net, net_buffered, torch.rand(batch_size, 3, args.size, args.size))
+
+'''
+Sample run (from InvisiCipher/):
+python -m app.models.ESRGAN.benchmarks.dense_block --size 128 --batch_sizes 1,2,4
+'''
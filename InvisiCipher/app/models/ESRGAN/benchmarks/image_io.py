@@ -0,0 +1,47 @@
+import argparse
+import numpy as np
+import torch
+from app.models.ESRGAN.service import bgr_to_tensor, tensor_to_bgr
+from app.models.ESRGAN.benchmarks.common import timed
+
+'''
+Pre- and post-processing cost around the ESRGAN model
+Compares the NumPy float64 / fancy-index / transpose path the service used before with the uint8 torch path
+'''
+
+parser = argparse.ArgumentParser(description='Benchmark ESRGAN image ingestion and output conversion')
+parser.add_argument('--size', type=int, default=1024, help='input size, the output is 4x larger per side')
+parser.add_argument('--repeats', type=int, default=5)
+args = parser.parse_args()
+
+
+def numpy_bgr_to_tensor(image):
+    image = image * 1.0 / 255
+    return torch.from_numpy(np.transpose(image[:, :, [2, 1, 0]], (2, 0, 1))).float()
+
+
+def numpy_tensor_to_bgr(image):
+    image = np.transpose(image.numpy()[[2, 1, 0], :, :], (1, 2, 0))
+    return (image * 255.0).round().astype(np.uint8)
+
+
+rng = np.random.default_rng(0)
+image = rng.integers(0, 256, (args.size, args.size, 3), dtype=np.uint8)
+output = torch.rand(3, args.size * 4, args.size * 4)
+
+for stage, old, new, data in (("input", numpy_bgr_to_tensor, bgr_to_tensor, image),
+                              ("output", numpy_tensor_to_bgr, tensor_to_bgr, output)):
+    old_result, old_time = timed(lambda: old(data), args.repeats)
+    new_result, new_time = timed(lambda: new(data), args.repeats)
+    if stage == "input":
+        difference = (old_result - new_result).abs().max().item()
+    else:
+        difference = np.abs(old_result.astype(np.int16) - new_result).max()
+    # speedup = numpy time / torch time, below 1 means the torch path is slower
+    print("{:6s} numpy {:8.1f} ms  torch uint8 {:8.1f} ms  speedup {:5.2f}x  max diff {}".format(
+        stage, old_time * 1000, new_time * 1000, old_time / new_time, difference))
+
+'''
+Sample run (from InvisiCipher/):
+python -m app.models.ESRGAN.benchmarks.image_io --size 1024
+'''
@@ -0,0 +1,45 @@
+import argparse
+import torch
+from app.models.ESRGAN.service import ESRGANService, DEFAULT_MODEL_PATH, bf16_supported
+from app.models.ESRGAN.benchmarks.common import load_input, psnr, timed
+
+'''
+Compare RRDBNet inference modes on this machine
+Reports the time per image and the PSNR drift of every mode against the fp32 output
+'''
+
+parser = argparse.ArgumentParser(description='Benchmark ESRGAN precision / memory format modes')
+parser.add_argument('--image', default='app/models/ESRGAN/LR/baboon.png')
+parser.add_argument('--size', type=int, default=128, help='center crop of the input, 0 for the full image')
+parser.add_argument('--model_path', default=DEFAULT_MODEL_PATH)
+parser.add_argument('--device', default=None)
+parser.add_argument('--repeats', type=int, default=3)
+parser.add_argument('--compile', action='store_true', default=False, help='also benchmark torch.compile modes')
+args = parser.parse_args()
+
+image = load_input(args.image, args.size)
+device = torch.device(args.device or ('cuda' if torch.cuda.is_available() else 'cpu'))
+
+modes = [("fp32", False), ("fp32", True)]
+if bf16_supported(device):
+    modes += [("bf16", False), ("bf16", True)]
+else:
+    print("bf16 is not supported on {:s}, skipping bf16 modes".format(str(device)))
+compile_flags = (False, True) if args.compile else (False,)
+
+print("Input {:s} {}x{} on {:s}".format(args.image, image.shape[1], image.shape[0], str(device)))
+reference, reference_time = None, None
+for compile_model in compile_flags:
+    for precision, channels_last in modes:
+        service = ESRGANService(args.model_path, str(device), precision, channels_last, compile_model)
+        output, seconds = timed(lambda: service.upscale(image, tile_size=None), args.repeats)
+        if reference is None:
+            reference, reference_time = output, seconds
+        name = precision + (" channels_last" if channels_last else "") + (" compiled" if compile_model else "")
+        print("{:28s} {:8.1f} ms  {:5.2f}x  PSNR vs fp32 {:6.2f} dB".format(
+            name, seconds * 1000, reference_time / seconds, psnr(reference, output)))
+
+'''
+Sample run (from InvisiCipher/):
+python -m app.models.ESRGAN.benchmarks.precision --image app/models/ESRGAN/LR/comic.png --compile
+'''
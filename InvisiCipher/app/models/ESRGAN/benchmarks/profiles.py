@@ -0,0 +1,45 @@
+import os
+import glob
+import argparse
+import cv2
+from app.models.ESRGAN.service import ESRGANService, DEFAULT_MODEL_PATH
+from app.models.ESRGAN.benchmarks.common import load_input, psnr, timed
+
+'''
+Speed / quality trade-off of generators with different RRDB block counts
+Every image is downscaled x4 (bicubic) and upscaled again by each generator, PSNR is reported against
+the original image and against the full teacher's output
+'''
+
+parser = argparse.ArgumentParser(description='Benchmark ESRGAN generators by block count')
+parser.add_argument('model_paths', nargs='+', help='student weights, e.g. one distill.py output per block count')
+parser.add_argument('--teacher_path', default=DEFAULT_MODEL_PATH)
+parser.add_argument('--image_dir',
+                    default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "LR"))
+parser.add_argument('--size', type=int, default=256, help='center crop of every image before downscaling, 0 for all')
+parser.add_argument('--device', default='cpu')
+parser.add_argument('--repeats', type=int, default=2)
+args = parser.parse_args()
+
+images = [load_input(path, args.size) for path in sorted(glob.glob(os.path.join(args.image_dir, "*")))]
+images = [image[:image.shape[0] // 4 * 4, :image.shape[1] // 4 * 4] for image in images]
+inputs = [cv2.resize(image, (image.shape[1] // 4, image.shape[0] // 4), interpolation=cv2.INTER_CUBIC)
+          for image in images]
+
+teacher_outputs, teacher_time = None, None
+for path in [args.teacher_path] + args.model_paths:
+    service = ESRGANService(path, args.device)
+    outputs, seconds = timed(lambda: [service.upscale(image, tile_size=None) for image in inputs], args.repeats)
+    if teacher_outputs is None:
+        teacher_outputs, teacher_time = outputs, seconds
+    ground_truth = sum(psnr(image, output) for image, output in zip(images, outputs)) / len(images)
+    teacher = sum(psnr(reference, output) for reference, output in zip(teacher_outputs, outputs)) / len(images)
+    print("{:2d} blocks {:40s} {:8.1f} ms/image  {:5.2f}x  PSNR vs HR {:6.2f} dB  vs teacher {:6.2f} dB".format(
+        service.num_blocks, os.path.basename(path), seconds * 1000 / len(images), teacher_time / seconds,
+        ground_truth, teacher))
+
+'''
+Sample run (from InvisiCipher/), after distilling one student per block count:
+python -m app.models.ESRGAN.benchmarks.profiles app/models/ESRGAN/models/RRDB_ESRGAN_x4_nb4.pth \
+    app/models/ESRGAN/models/RRDB_ESRGAN_x4_nb6.pth app/models/ESRGAN/models/RRDB_ESRGAN_x4_nb8.pth
+'''
@@ -0,0 +1,135 @@
+import os
+import glob
+import time
+import random
+import argparse
+import cv2
+import torch
+import torch.nn.functional as F
+from app.models.ESRGAN import RRDBNet_arch as arch
+from app.models.ESRGAN.service import DEFAULT_MODEL_PATH, FAST_MODEL_PATH
+from app.models.ESRGAN.weights import load_weights, resolve_weights, num_blocks
+
+'''
+Distill a smaller RRDBNet from the 23 block x4 generator
+The student keeps the teacher's head, upsampler and an evenly spaced subset of its RRDB blocks,
+then learns to match the teacher's output (L1) on random low resolution crops of a local image folder
+'''
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".webp")
+
+
+def student_from_teacher(teacher_state_dict, blocks):
+    """Student state dict initialised from the teacher, RRDB block i copies teacher block round(i * step)"""
+
+    teacher_blocks = num_blocks(teacher_state_dict)
+    picks = [round(i * (teacher_blocks - 1) / max(1, blocks - 1)) for i in range(blocks)]
+    state_dict = {}
+    for key, value in teacher_state_dict.items():
+        if not key.startswith('RRDB_trunk.'):
+            state_dict[key] = value.clone()
+    for i, pick in enumerate(picks):
+        prefix = 'RRDB_trunk.{:d}.'.format(pick)
+        for key, value in teacher_state_dict.items():
+            if key.startswith(prefix):
+                state_dict['RRDB_trunk.{:d}.'.format(i) + key[len(prefix):]] = value.clone()
+    return state_dict
+
+
+class CropSampler:
+    """Random RGB float crops of the images in a folder, downscaled x4 first when the images are high resolution"""
+
+    def __init__(self, image_dir, crop_size=32, downscale=False):
+        paths = sorted(path for path in glob.glob(os.path.join(image_dir, "*"))
+                       if path.lower().endswith(IMAGE_EXTENSIONS))
+        if not paths:
+            raise FileNotFoundError("no training images in {:s}".format(image_dir))
+        self.images = []
+        for path in paths:
+            image = cv2.imread(path, cv2.IMREAD_COLOR)
+            if downscale:
+                image = cv2.resize(image, (image.shape[1] // 4, image.shape[0] // 4), interpolation=cv2.INTER_CUBIC)
+            if min(image.shape[:2]) >= crop_size:
+                self.images.append(torch.from_numpy(image[:, :, ::-1].transpose(2, 0, 1) / 255.0).float())
+        if not self.images:
+            raise ValueError("every training image is smaller than the {:d}px crop".format(crop_size))
+        self.crop_size = crop_size
+
+    def sample(self, batch_size):
+        crops = []
+        for _ in range(batch_size):
+            image = random.choice(self.images)
+            y = random.randint(0, image.shape[1] - self.crop_size)
+            x = random.randint(0, image.shape[2] - self.crop_size)
+            crop = image[:, y:y + self.crop_size, x:x + self.crop_size]
+            if random.random() < 0.5:
+                crop = crop.flip(2)
+            crops.append(crop)
+        return torch.stack(crops)
+
+
+def distill(image_dir, output_path=FAST_MODEL_PATH, blocks=6, teacher_path=DEFAULT_MODEL_PATH, steps=20000,
+            batch_size=8, crop_size=32, lr=1e-4, downscale=False, device=None, log_every=100, save_every=1000):
+    """Trains a student with blocks RRDB blocks against the teacher, saves its state dict to output_path"""
+
+    device = torch.device(device or ('cuda' if torch.cuda.is_available() else 'cpu'))
+    teacher_state_dict = load_weights(resolve_weights(teacher_path))
+    teacher = arch.RRDBNet(3, 3, 64, num_blocks(teacher_state_dict), gc=32)
+    teacher.load_state_dict(teacher_state_dict, strict=True)
+    teacher.eval().requires_grad_(False).to(device)
+
+    student = arch.RRDBNet(3, 3, 64, blocks, gc=32)
+    student.load_state_dict(student_from_teacher(teacher_state_dict, blocks), strict=True)
+    student.train().to(device)
+
+    sampler = CropSampler(image_dir, crop_size, downscale)
+    optimizer = torch.optim.Adam(student.parameters(), lr=lr, betas=(0.9, 0.99))
+    scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(optimizer, steps)
+    print("Distilling {:d} -> {:d} blocks on {:d} images ({:s})".format(
+        num_blocks(teacher_state_dict), blocks, len(sampler.images), str(device)))
+
+    start, running = time.perf_counter(), 0.0
+    for step in range(1, steps + 1):
+        batch = sampler.sample(batch_size).to(device)
+        with torch.no_grad():
+            target = teacher(batch)
+        loss = F.l1_loss(student(batch), target)
+        optimizer.zero_grad(set_to_none=True)
+        loss.backward()
+        optimizer.step()
+        scheduler.step()
+
+        running += loss.item()
+        if step % log_every == 0:
+            print("step {:d}/{:d}  l1 {:.5f}  {:.2f} steps/sec".format(
+                step, steps, running / log_every, step / (time.perf_counter() - start)))
+            running = 0.0
+        if step % save_every == 0 or step == steps:
+            torch.save(student.state_dict(), output_path)
+    print("Student saved as: ", output_path)
+    return output_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Distill a fast ESRGAN student with fewer RRDB blocks')
+    parser.add_argument('--image_dir', required=True, help='folder of training images')
+    parser.add_argument('--downscale', action='store_true', default=False,
+                        help='images are high resolution, train on their x4 bicubic downscale')
+    parser.add_argument('--blocks', type=int, default=6, help='RRDB blocks of the student, 4-8 is a good range')
+    parser.add_argument('--teacher_path', default=DEFAULT_MODEL_PATH)
+    parser.add_argument('--output', default=FAST_MODEL_PATH)
+    parser.add_argument('--steps', type=int, default=20000)
+    parser.add_argument('--batch_size', type=int, default=8)
+    parser.add_argument('--crop_size', type=int, default=32)
+    parser.add_argument('--lr', type=float, default=1e-4)
+    parser.add_argument('--device', default=None)
+    args = parser.parse_args()
+
+    distill(args.image_dir, args.output, args.blocks, args.teacher_path, args.steps, args.batch_size, args.crop_size,
+            args.lr, args.downscale, args.device)
+
+'''
+Sample run (from InvisiCipher/):
+python -m app.models.ESRGAN.distill --image_dir datasets/DIV2K_train_HR --downscale --blocks 6
+then upscale_image(path, profile="fast") or INVISICIPHER_ESRGAN_PROFILE=fast
+'''
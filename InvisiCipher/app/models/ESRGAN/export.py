@@ -0,0 +1,88 @@
+import time
+import argparse
+import torch
+from app.models.ESRGAN import RRDBNet_arch as arch
+from app.models.ESRGAN.weights import load_weights, resolve_weights, num_blocks
+from app.models.ESRGAN.service import DEFAULT_MODEL_PATH, ESRGANService, backend_model_path
+
+'''
+Export the x4 generator to TorchScript and ONNX with dynamic batch, height and width
+Both run without building the Python module graph, see the backend option of ESRGANService.
+--check compares every export against the eager model on an input size not used for tracing
+'''
+
+FORMATS = ("torchscript", "onnx")
+
+# Traced at a small size, the graphs are shape independent
+EXAMPLE_SIZE = 32
+
+
+def load_model(model_path=DEFAULT_MODEL_PATH):
+    state_dict = load_weights(resolve_weights(model_path))
+    model = arch.RRDBNet(3, 3, 64, num_blocks(state_dict), gc=32)
+    model.load_state_dict(state_dict, strict=True)
+    model.eval()
+    model.requires_grad_(False)
+    return model
+
+
+def export_torchscript(model, path):
+    # Traced, the architecture passes an int scale_factor that the scripting compiler rejects
+    example = torch.rand(1, 3, EXAMPLE_SIZE, EXAMPLE_SIZE)
+    traced = torch.jit.freeze(torch.jit.trace(model, example, check_trace=False))
+    torch.jit.save(traced, path)
+    return path
+
+
+def export_onnx(model, path, opset=17):
+    example = torch.rand(1, 3, EXAMPLE_SIZE, EXAMPLE_SIZE)
+    axes = {0: 'batch', 2: 'height', 3: 'width'}
+    torch.onnx.export(model, (example,), path, input_names=['input'], output_names=['output'],
+                      dynamic_axes={'input': axes, 'output': axes}, opset_version=opset, dynamo=False)
+    return path
+
+
+def check(model_path, formats, height=45, width=61, repeats=3):
+    """Max absolute difference and time per forward pass of every exported backend against eager"""
+
+    image = torch.rand(2, 3, height, width)
+    reference, eager_time = None, None
+    for backend in ("eager",) + tuple(formats):
+        service = ESRGANService(model_path, 'cpu', backend=backend)
+        output = service.forward(image)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            service.forward(image)
+        seconds = (time.perf_counter() - start) / repeats
+        if reference is None:
+            reference, eager_time = output, seconds
+        print("{:12s} {:8.1f} ms  {:5.2f}x  max abs diff {:.2e}".format(
+            backend, seconds * 1000, eager_time / seconds, (output - reference).abs().max().item()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Export the ESRGAN generator to TorchScript / ONNX')
+    parser.add_argument('--model_path', default=DEFAULT_MODEL_PATH)
+    parser.add_argument('--format', choices=FORMATS + ("all",), default="all")
+    parser.add_argument('--opset', type=int, default=17)
+    parser.add_argument('--check', action='store_true', default=False, help='compare exports with the eager model')
+    args = parser.parse_args()
+
+    formats = FORMATS if args.format == "all" else (args.format,)
+    model = load_model(args.model_path)
+    for backend in formats:
+        path = backend_model_path(args.model_path, backend)
+        if backend == "torchscript":
+            export_torchscript(model, path)
+        else:
+            export_onnx(model, path, args.opset)
+        print("{:s} model saved as: {:s}".format(backend, path))
+
+    if args.check:
+        check(args.model_path, formats)
+
+'''
+Sample run (from InvisiCipher/):
+python -m app.models.ESRGAN.export --check
+then set INVISICIPHER_ESRGAN_BACKEND=onnx or call upscale_image(path, backend="onnx")
+'''
@@ -0,0 +1,83 @@
+import threading
+from collections import OrderedDict
+import torch
+
+'''
+Network interpolation between the PSNR-oriented and the ESRGAN generator
+Both state dicts are flattened into one vector each, so a blend is a single torch.lerp instead of
+a loop over every tensor, and blended generators are kept in a small LRU keyed by alpha
+'''
+
+
+def flatten_state_dict(state_dict):
+    """Concatenates the float tensors of a state dict into one vector, returns (flat, layout)"""
+
+    layout = [(name, tensor.shape) for name, tensor in state_dict.items()]
+    flat = torch.cat([tensor.detach().reshape(-1).float() for tensor in state_dict.values()])
+    return flat, layout
+
+
+def unflatten_state_dict(flat, layout):
+    """State dict of views into flat, the inverse of flatten_state_dict"""
+
+    state_dict, offset = OrderedDict(), 0
+    for name, shape in layout:
+        numel = shape.numel()
+        state_dict[name] = flat[offset:offset + numel].view(shape)
+        offset += numel
+    return state_dict
+
+
+def interpolate_state_dicts(psnr_state_dict, esrgan_state_dict, alpha):
+    """(1 - alpha) * PSNR + alpha * ESRGAN weights, alpha=0 is smooth and alpha=1 is the sharpest"""
+
+    psnr_flat, layout = flatten_state_dict(psnr_state_dict)
+    esrgan_flat, _ = flatten_state_dict(OrderedDict((name, esrgan_state_dict[name]) for name, _ in layout))
+    return unflatten_state_dict(torch.lerp(psnr_flat, esrgan_flat, alpha), layout)
+
+
+class InterpolatedModels:
+    """LRU of generators with blended PSNR/ESRGAN weights, keyed by alpha rounded to two decimals
+
+    build() returns an empty generator, weights are assigned as views of the blended vector so every cached
+    model costs one copy of the parameters.
+    """
+
+    def __init__(self, build, psnr_state_dict, esrgan_state_dict, device, size=3,
+                 memory_format=torch.contiguous_format):
+        self.build = build
+        self.size = size
+        self.device = device
+        self.memory_format = memory_format
+        self._psnr, self._layout = flatten_state_dict(psnr_state_dict)
+        self._psnr = self._psnr.to(device)
+        self._esrgan = flatten_state_dict(
+            OrderedDict((name, esrgan_state_dict[name]) for name, _ in self._layout))[0].to(device)
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, alpha):
+        if not 0.0 <= alpha <= 1.0:
+            raise ValueError("alpha must be in [0, 1], got {}".format(alpha))
+        key = round(float(alpha), 2)
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                return model
+
+            flat = torch.lerp(self._psnr, self._esrgan, key)
+            model = self.build()
+            model.load_state_dict(unflatten_state_dict(flat, self._layout), strict=True, assign=True)
+            model.eval()
+            model.requires_grad_(False)
+            if self.memory_format != torch.contiguous_format:
+                model = model.to(memory_format=self.memory_format)
+            self._models[key] = model
+            while len(self._models) > self.size:
+                self._models.popitem(last=False)
+            return model
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
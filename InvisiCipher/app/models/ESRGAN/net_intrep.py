@@ -1,6 +1,6 @@
 import sys
 import torch
-from collections import OrderedDict
+from interpolation import interpolate_state_dicts
 
 alpha = float(sys.argv[1])
 
@@ -10,12 +10,10 @@ net_interp_path = './models/interp_{:02d}.pth'.format(int(alpha*10))
 
 net_PSNR = torch.load(net_PSNR_path)
 net_ESRGAN = torch.load(net_ESRGAN_path)
-net_interp = OrderedDict()
 
 print('Interpolating with alpha = ', alpha)
 
-for k, v_PSNR in net_PSNR.items():
-    v_ESRGAN = net_ESRGAN[k]
-    net_interp[k] = (1 - alpha) * v_PSNR + alpha * v_ESRGAN
+# Same blend as the service uses at runtime (ESRGANService.upscale(..., alpha=...)), no file needed there
+net_interp = interpolate_state_dicts(net_PSNR, net_ESRGAN, alpha)
 
 torch.save(net_interp, net_interp_path)
\ No newline at end of file
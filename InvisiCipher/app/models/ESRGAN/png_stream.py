@@ -0,0 +1,90 @@
+import os
+import zlib
+import struct
+import numpy as np
+
+'''
+Incremental PNG encoder for outputs too large to hold in memory
+Rows are filtered, deflated and written as IDAT chunks as they arrive, so the tiled upscaler
+can hand over every finished band and the full-resolution image never exists at once
+'''
+
+SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# zlib level, 1 is close to cv2.imwrite's default and several times faster than 6 for a few percent in size
+COMPRESS_LEVEL = 1
+
+# PNG "Sub" filter: every byte minus the same channel of the pixel on its left
+_FILTER_SUB = 1
+
+
+def _chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+class PngStreamWriter:
+    """Writes an 8 bit RGB PNG of a known size band by band
+
+    write_rows() takes (h, width, 3) uint8 RGB rows from the top down, close() checks that
+    exactly height rows were written and finishes the file.
+    """
+
+    def __init__(self, path, width, height, compress_level=COMPRESS_LEVEL):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.rows = 0
+        self._compressor = zlib.compressobj(compress_level)
+        self._file = open(path, 'wb')
+        # 8 bit depth, colour type 2 (RGB), deflate, adaptive filtering, no interlace
+        self._file.write(SIGNATURE + _chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+
+    def write_rows(self, rows):
+        if rows.dtype != np.uint8 or rows.ndim != 3 or rows.shape[1:] != (self.width, 3):
+            raise ValueError("expected (h, {:d}, 3) uint8 rows, got {} {}".format(self.width, rows.dtype, rows.shape))
+        if self.rows + rows.shape[0] > self.height:
+            raise ValueError("more than {:d} rows written to {:s}".format(self.height, self.path))
+
+        # Filter byte followed by the filtered scanline, uint8 arithmetic wraps modulo 256 as PNG expects
+        scanlines = np.empty((rows.shape[0], 1 + 3 * self.width), dtype=np.uint8)
+        scanlines[:, 0] = _FILTER_SUB
+        filtered = scanlines[:, 1:].reshape(rows.shape)
+        filtered[:, 0] = rows[:, 0]
+        np.subtract(rows[:, 1:], rows[:, :-1], out=filtered[:, 1:])
+
+        data = self._compressor.compress(scanlines)
+        if data:
+            self._file.write(_chunk(b'IDAT', data))
+        self.rows += rows.shape[0]
+
+    def close(self):
+        if self._file.closed:
+            return
+        try:
+            if self.rows != self.height:
+                raise ValueError("{:s} got {:d} of {:d} rows".format(self.path, self.rows, self.height))
+            self._file.write(_chunk(b'IDAT', self._compressor.flush()) + _chunk(b'IEND', b''))
+        finally:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            # Do not leave a truncated image behind
+            self._file.close()
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+'''
+Sample usage:
+with PngStreamWriter('upscaled.png', width, height) as writer:
+    for band in bands:
+        writer.write_rows(band)
+'''
@@ -0,0 +1,99 @@
+import os
+import glob
+import argparse
+import torch
+from torch.ao.quantization import get_default_qconfig_mapping
+from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+from app.models.ESRGAN import RRDBNet_arch as arch
+from app.models.ESRGAN.weights import load_weights, resolve_weights, num_blocks
+from app.models.ESRGAN.service import DEFAULT_MODEL_PATH, INT8_ENGINE, ESRGANService, int8_model_path
+from app.models.ESRGAN.benchmarks.common import load_input, psnr, timed
+
+'''
+Static int8 quantization of the ESRGAN generator for CPU inference
+FX graph mode quantizes every Conv2d (activations and weights), calibrated on ESRGAN/LR,
+and the result is saved as TorchScript next to the fp32 weights.
+Dynamic quantization is not an option here, it only covers Linear/LSTM layers and RRDBNet is all Conv2d
+'''
+
+CALIBRATION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "LR")
+
+
+def calibration_inputs(calibration_dir=CALIBRATION_DIR, size=64, count=16):
+    """(1, 3, size, size) RGB float crops of the calibration images, several per image on a grid"""
+
+    paths = sorted(glob.glob(os.path.join(calibration_dir, "*")))
+    if not paths:
+        raise FileNotFoundError("no calibration images in {:s}".format(calibration_dir))
+    crops = []
+    for path in paths:
+        image = load_input(path)
+        image = torch.from_numpy(image[:, :, [2, 1, 0]].transpose(2, 0, 1) / 255.0).float()
+        height, width = image.shape[1:]
+        for y in range(0, height - size + 1, size):
+            for x in range(0, width - size + 1, size):
+                crops.append(image[None, :, y:y + size, x:x + size])
+    # Spread the budget evenly over all images and regions
+    step = max(1, len(crops) // count)
+    return crops[::step][:count]
+
+
+def quantize(model_path=DEFAULT_MODEL_PATH, calibration_dir=CALIBRATION_DIR, size=64, count=16):
+    """Quantizes the RRDBNet weights at model_path, returns the scripted int8 module"""
+
+    torch.backends.quantized.engine = INT8_ENGINE
+    state_dict = load_weights(resolve_weights(model_path))
+    model = arch.RRDBNet(3, 3, 64, num_blocks(state_dict), gc=32)
+    model.load_state_dict(state_dict, strict=True)
+    model.eval()
+
+    inputs = calibration_inputs(calibration_dir, size, count)
+    prepared = prepare_fx(model, get_default_qconfig_mapping(INT8_ENGINE), example_inputs=(inputs[0],))
+    with torch.inference_mode():
+        for i, batch in enumerate(inputs):
+            print("\rCalibrating {:d}/{:d}".format(i + 1, len(inputs)), end="")
+            prepared(batch)
+    print()
+    # Traced, the architecture passes an int scale_factor that the scripting compiler rejects
+    return torch.jit.trace(convert_fx(prepared), inputs[0], check_trace=False)
+
+
+def compare(model_path, image_filepath, size, repeats=3):
+    """Upscales the same crop with the fp32 and int8 models, prints latency and PSNR deltas"""
+
+    image = load_input(image_filepath, size)
+    results = {}
+    for precision in ("fp32", "int8"):
+        service = ESRGANService(model_path, 'cpu', precision)
+        results[precision] = timed(lambda: service.upscale(image, tile_size=None), repeats)
+
+    (reference, fp32_time), (output, int8_time) = results["fp32"], results["int8"]
+    print("fp32 {:8.1f} ms".format(fp32_time * 1000))
+    print("int8 {:8.1f} ms  {:5.2f}x  PSNR vs fp32 {:6.2f} dB".format(
+        int8_time * 1000, fp32_time / int8_time, psnr(reference, output)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Quantize the ESRGAN generator to int8 for CPU inference')
+    parser.add_argument('--model_path', default=DEFAULT_MODEL_PATH)
+    parser.add_argument('--calibration_dir', default=CALIBRATION_DIR)
+    parser.add_argument('--calibration_size', type=int, default=64, help='size of the calibration crops')
+    parser.add_argument('--calibration_count', type=int, default=16, help='number of calibration crops')
+    parser.add_argument('--check_image', default=os.path.join(CALIBRATION_DIR, "baboon.png"))
+    parser.add_argument('--check_size', type=int, default=128, help='center crop used for the check, 0 for all')
+    parser.add_argument('--no_check', action='store_true', default=False)
+    args = parser.parse_args()
+
+    quantized = quantize(args.model_path, args.calibration_dir, args.calibration_size, args.calibration_count)
+    output_path = int8_model_path(args.model_path)
+    torch.jit.save(quantized, output_path)
+    print("int8 model saved as: ", output_path)
+
+    if not args.no_check:
+        compare(args.model_path, args.check_image, args.check_size)
+
+'''
+Sample run (from InvisiCipher/):
+python -m app.models.ESRGAN.quantize
+then set INVISICIPHER_ESRGAN_PRECISION=int8 or call upscale_image(path, precision="int8")
+'''
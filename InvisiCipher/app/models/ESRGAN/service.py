@@ -0,0 +1,362 @@
+import os
+import functools
+import warnings
+import threading
+import cv2
+import numpy as np
+import torch
+from app.models.ESRGAN import RRDBNet_arch as arch
+from app.models.ESRGAN.tiling import upscale_tiled, iter_upscaled_rows, TILE_SIZE, TILE_OVERLAP, TILE_BATCH_SIZE
+from app.models.ESRGAN.interpolation import InterpolatedModels
+from app.models.ESRGAN.weights import load_weights, resolve_weights, num_blocks
+from app.models.ESRGAN.tile_planner import AUTO, plan_tiles, back_off, is_out_of_memory, describe
+from app.models.ESRGAN.png_stream import PngStreamWriter, COMPRESS_LEVEL
+
+'''
+Shared ESRGAN upscaler
+Builds RRDBNet and loads its weights once per process, the UI and upscale_image both go through it
+'''
+
+# Resolve model paths relative to this file so cloned repos work
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+DEFAULT_MODEL_PATH = os.path.join(MODELS_DIR, "RRDB_ESRGAN_x4.pth")
+# PSNR-oriented generator used for alpha interpolation, not shipped with the repo
+PSNR_MODEL_PATH = os.path.join(MODELS_DIR, "RRDB_PSNR_x4.pth")
+# Student with fewer RRDB blocks distilled from the x4 weights by distill.py, for quick/thumbnail work
+FAST_MODEL_PATH = os.path.join(MODELS_DIR, "RRDB_ESRGAN_x4_fast.pth")
+
+PROFILES = {"full": DEFAULT_MODEL_PATH, "fast": FAST_MODEL_PATH}
+PROFILE = os.environ.get("INVISICIPHER_ESRGAN_PROFILE", "full")
+
+SCALE = 4
+
+# int8 runs the TorchScript model written by quantize.py next to the fp32 weights, CPU only
+PRECISIONS = ("fp32", "bf16", "int8")
+
+# Quantized kernels, x86 dispatches to fbgemm/onednn, use qnnpack on ARM
+INT8_ENGINE = os.environ.get("INVISICIPHER_ESRGAN_INT8_ENGINE", "x86")
+
+# eager builds RRDBNet in Python, torchscript and onnx run the graphs written by export.py
+BACKENDS = ("eager", "torchscript", "onnx")
+
+# Per deployment inference mode, see benchmarks/precision.py to pick one
+PRECISION = os.environ.get("INVISICIPHER_ESRGAN_PRECISION", "fp32")
+CHANNELS_LAST = os.environ.get("INVISICIPHER_ESRGAN_CHANNELS_LAST", "0") == "1"
+COMPILE = os.environ.get("INVISICIPHER_ESRGAN_COMPILE", "0") == "1"
+BACKEND = os.environ.get("INVISICIPHER_ESRGAN_BACKEND", "eager")
+# Dense blocks writing into one preallocated feature buffer instead of torch.cat, see benchmarks/dense_block.py
+DENSE_BUFFER = os.environ.get("INVISICIPHER_ESRGAN_DENSE_BUFFER", "0") == "1"
+
+# Blended generators kept per service for alpha interpolation, each costs one copy of the weights
+INTERP_CACHE_SIZE = int(os.environ.get("INVISICIPHER_ESRGAN_INTERP_CACHE", "3"))
+
+
+def bf16_supported(device):
+    """True when the device has native bfloat16 math (CUDA support check, oneDNN bf16 kernels on CPU)"""
+
+    if device.type == 'cuda':
+        return torch.cuda.is_bf16_supported()
+    if not torch.backends.mkldnn.is_available():
+        return False
+    # Public check where the torch build has it, otherwise the probe torch itself uses
+    is_bf16_supported = getattr(torch.backends.mkldnn, 'is_bf16_supported', None)
+    if is_bf16_supported is not None:
+        return is_bf16_supported()
+    return torch.ops.mkldnn._is_mkldnn_bf16_supported()
+
+
+def int8_model_path(model_path):
+    """Path of the quantized TorchScript model for an fp32 weights file, e.g. RRDB_ESRGAN_x4_int8.pt"""
+
+    return os.path.splitext(model_path)[0] + "_int8.pt"
+
+
+def backend_model_path(model_path, backend):
+    """Path of the exported generator for an fp32 weights file and backend, e.g. RRDB_ESRGAN_x4.onnx"""
+
+    stem = os.path.splitext(model_path)[0]
+    return {"eager": model_path, "torchscript": stem + "_torchscript.pt", "onnx": stem + ".onnx"}[backend]
+
+
+class OnnxGenerator:
+    """Runs an exported generator with ONNX Runtime, takes and returns (N, 3, H, W) float tensors"""
+
+    def __init__(self, path, device):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        providers = ["CUDAExecutionProvider", "CPUExecutionProvider"] if device.type == 'cuda' else \
+            ["CPUExecutionProvider"]
+        self.session = ort.InferenceSession(path, options, providers=providers)
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch):
+        batch = np.ascontiguousarray(batch.cpu().numpy(), dtype=np.float32)
+        return torch.from_numpy(self.session.run(None, {self.input_name: batch})[0])
+
+
+def bgr_to_tensor(image):
+    """BGR uint8 image (cv2 layout) to a (3, H, W) RGB float tensor in [0, 1]
+
+    The uint8 array is wrapped without a copy, the channel swap and layout change stay in uint8
+    and the conversion to float and scaling happen on the way out.
+    """
+
+    if min(image.strides) < 0 or not image.flags.writeable:
+        # torch cannot wrap negative strides (e.g. a flipped view) and warns on read-only arrays
+        image = image.copy()
+    return torch.from_numpy(image).permute(2, 0, 1).flip(0).to(torch.float32,
+                                                              memory_format=torch.contiguous_format).div_(255)
+
+
+def tensor_to_bgr(image):
+    """(3, H, W) RGB float tensor in [0, 1] to a BGR uint8 image (cv2 layout)
+
+    Scales and rounds one channel at a time into a reused float plane and writes it into a contiguous uint8
+    tensor, whose memory the returned array shares. A full-size float temporary costs more than the three
+    small passes.
+    """
+
+    _, height, width = image.shape
+    out = torch.empty(height, width, 3, dtype=torch.uint8)
+    scratch = torch.empty(height, width)
+    for c in range(3):
+        torch.mul(image[2 - c], 255.0, out=scratch).round_()
+        out[:, :, c] = scratch
+    return out.numpy()
+
+
+class ESRGANService:
+    """RRDBNet x4 generator kept on its device in inference mode
+
+    precision is fp32, bf16 (autocast, falls back to fp32 where the hardware has no bf16 support)
+    or int8 (quantized model from quantize.py, CPU only), channels_last switches the weights and inputs
+    to NHWC and compile runs the model through torch.compile.
+    backend selects eager RRDBNet or the TorchScript / ONNX Runtime exports of the same weights, onnx is fp32 only.
+    Eager fp32/bf16 services also take a per call alpha that blends in the PSNR generator at psnr_model_path.
+    dense_buffer builds the eager generator with buffered dense blocks (same weights, fewer copies).
+    """
+
+    def __init__(self, model_path=DEFAULT_MODEL_PATH, device=None, precision="fp32", channels_last=False,
+                 compile=False, backend="eager", psnr_model_path=PSNR_MODEL_PATH, dense_buffer=False):
+        if precision not in PRECISIONS:
+            raise ValueError("unknown precision: {:s}".format(precision))
+        if backend not in BACKENDS:
+            raise ValueError("unknown backend: {:s}".format(backend))
+        if backend == "onnx" and (precision != "fp32" or channels_last or compile):
+            raise ValueError("the onnx backend runs fp32 without channels_last or compile")
+        if precision == "int8":
+            device = device or 'cpu'
+        self.device = torch.device(device or ('cuda' if torch.cuda.is_available() else 'cpu'))
+        if precision == "int8" and self.device.type != 'cpu':
+            raise ValueError("int8 models only run on CPU")
+        if precision == "bf16" and not bf16_supported(self.device):
+            warnings.warn("bf16 is not supported on {:s}, using fp32".format(str(self.device)), RuntimeWarning)
+            precision = "fp32"
+        self.precision = precision
+        self.channels_last = channels_last
+        self.backend = backend
+        self.psnr_model_path = psnr_model_path
+        self.dense_buffer = dense_buffer
+        self._interpolated = None
+
+        if precision == "int8":
+            model_path = int8_model_path(model_path)
+            if not os.path.exists(model_path):
+                raise FileNotFoundError("{:s} not found, create it with quantize.py".format(model_path))
+            torch.backends.quantized.engine = INT8_ENGINE
+            model = torch.jit.load(model_path, map_location='cpu')
+        elif backend != "eager":
+            model_path = backend_model_path(model_path, backend)
+            if not os.path.exists(model_path):
+                raise FileNotFoundError("{:s} not found, create it with export.py".format(model_path))
+            if backend == "onnx":
+                model = OnnxGenerator(model_path, self.device)
+            else:
+                model = torch.jit.load(model_path, map_location=self.device)
+        else:
+            # Weights are memory-mapped where the file allows it and assigned without a copy,
+            # worker processes then share the page cache instead of each holding a private copy
+            model_path = resolve_weights(model_path)
+            state_dict = load_weights(model_path, self.device)
+            self.num_blocks = num_blocks(state_dict)
+            model = self._build_module()
+            model.load_state_dict(state_dict, strict=True, assign=True)
+            model.requires_grad_(False)
+        self.model_path = model_path
+        if backend != "onnx":
+            model = model.eval().to(self.device)
+        if channels_last:
+            model = model.to(memory_format=torch.channels_last)
+        self._module = model
+        self.model = torch.compile(model) if compile else model
+        print('Model path {:s} loaded on {:s} ({:s}, {:s}{:s}{:s}{:s})'.format(
+            model_path, str(self.device), backend, precision, ", channels_last" if channels_last else "",
+            ", compiled" if compile else "", ", dense buffer" if dense_buffer and backend == "eager" else ""))
+
+        # One upscale at a time, concurrent requests would multiply peak activation memory
+        self._lock = threading.Lock()
+
+    def forward(self, batch, model=None):
+        """Runs a (N, 3, H, W) float batch through the model in the configured mode, returns fp32"""
+
+        batch = batch.to(self.device)
+        if self.channels_last:
+            batch = batch.contiguous(memory_format=torch.channels_last)
+        with torch.inference_mode(), torch.autocast(self.device.type, dtype=torch.bfloat16,
+                                                    enabled=self.precision == "bf16"):
+            return (model or self.model)(batch).float()
+
+    def interpolated_model(self, alpha):
+        """Generator with (1 - alpha) * PSNR + alpha * ESRGAN weights, cached per alpha, alpha=1 is the base model"""
+
+        if alpha == 1:
+            return self.model
+        if self.backend != "eager" or self.precision == "int8":
+            raise ValueError("alpha interpolation needs the eager fp32/bf16 model")
+        if self._interpolated is None:
+            if not os.path.exists(self.psnr_model_path):
+                raise FileNotFoundError("PSNR model not found at {:s}".format(self.psnr_model_path))
+            psnr_state_dict = load_weights(resolve_weights(self.psnr_model_path))
+            memory_format = torch.channels_last if self.channels_last else torch.contiguous_format
+            self._interpolated = InterpolatedModels(self._build_module, psnr_state_dict, self._module.state_dict(),
+                                                    self.device, INTERP_CACHE_SIZE, memory_format)
+        return self._interpolated.get(alpha)
+
+    def _build_module(self):
+        # Empty generator on the meta device, nothing is allocated before the weights are assigned
+        with torch.device('meta'):
+            model = arch.RRDBNet(3, 3, 64, self.num_blocks, gc=32, dense_buffer=self.dense_buffer)
+        return model
+
+    def upscale_tensor(self, image, tile_size=TILE_SIZE, overlap=TILE_OVERLAP, batch_size=TILE_BATCH_SIZE,
+                       on_tile=None, alpha=None, on_plan=None):
+        """Upscales a (N, 3, H, W) RGB float batch, returns the (N, 3, H * 4, W * 4) CPU result in [0, 1]
+
+        tile_size=None runs the whole batch in one forward pass, tiling works on one image at a time
+        and reports every finished tile to on_tile(y, x, tile). tile_size="auto" picks tile and batch size
+        from the free memory (batch_size is ignored) and reports every attempted TilePlan to on_plan(plan).
+        alpha blends towards the PSNR generator.
+        """
+
+        if tile_size == AUTO:
+            _, _, height, width = image.shape
+            return self._run_planned(height, width, overlap, on_tile is None and image.shape[0] == 1, False,
+                                     lambda plan: self.upscale_tensor(image, plan.tile_size, plan.overlap,
+                                                                      plan.batch_size, on_tile, alpha), on_plan)
+        with self._lock, torch.inference_mode():
+            forward = self._forward_for(alpha)
+            if tile_size is None:
+                return forward(image).cpu().clamp_(0, 1)
+            return torch.cat([upscale_tiled(forward, image[i:i + 1], SCALE, tile_size, overlap, batch_size,
+                                            on_tile) for i in range(image.shape[0])])
+
+    def _forward_for(self, alpha):
+        if alpha is None:
+            return self.forward
+        return functools.partial(self.forward, model=self.interpolated_model(alpha))
+
+    def _run_planned(self, height, width, overlap, allow_whole, streaming, run, on_plan=None):
+        # Calls run(plan) with the planned tiles, backs off to smaller plans on allocation failures
+        plan = plan_tiles(height, width, self.device, scale=SCALE, overlap=overlap, allow_whole=allow_whole,
+                          streaming=streaming)
+        while True:
+            print(describe(plan, height, width))
+            if on_plan is not None:
+                on_plan(plan)
+            try:
+                return run(plan)
+            except Exception as e:
+                smaller = back_off(plan, height, width)
+                if not is_out_of_memory(e) or smaller is None:
+                    raise
+                print("Out of memory, retrying with a smaller tile plan")
+                if self.device.type == 'cuda':
+                    torch.cuda.empty_cache()
+                plan = smaller
+
+    def upscale(self, image, tile_size=TILE_SIZE, overlap=TILE_OVERLAP, batch_size=TILE_BATCH_SIZE, on_tile=None,
+                alpha=None, on_plan=None):
+        """Upscales an image file path or BGR uint8 array (cv2 layout), returns the BGR uint8 result
+
+        tile_size=None runs the whole image in one forward pass and "auto" plans tiles from the free memory,
+        otherwise on_tile(y, x, tile) receives every finished RGB float tile.
+        alpha in [0, 1] trades ESRGAN sharpness (1) for PSNR smoothness (0).
+        """
+
+        if isinstance(image, (str, os.PathLike)):
+            image = cv2.imread(os.fspath(image), cv2.IMREAD_COLOR)
+            if image is None:
+                raise IOError("could not read image")
+
+        image_high_res = self.upscale_tensor(bgr_to_tensor(image).unsqueeze(0), tile_size, overlap, batch_size,
+                                             on_tile, alpha, on_plan)
+        return tensor_to_bgr(image_high_res[0])
+
+    def upscale_to_png(self, image, output_path, tile_size=AUTO, overlap=TILE_OVERLAP, batch_size=TILE_BATCH_SIZE,
+                       on_tile=None, alpha=None, compress_level=COMPRESS_LEVEL, on_plan=None):
+        """Upscales an image file path or BGR uint8 array straight into a PNG file, returns output_path
+
+        Finished tile rows are encoded as they come out of the tiling engine, so peak memory is one
+        tile row instead of the whole x4 result. Always tiles, tile_size=None falls back to "auto".
+        """
+
+        if isinstance(image, (str, os.PathLike)):
+            image = cv2.imread(os.fspath(image), cv2.IMREAD_COLOR)
+            if image is None:
+                raise IOError("could not read image")
+        image = bgr_to_tensor(image).unsqueeze(0)
+        _, _, height, width = image.shape
+
+        if tile_size is None or tile_size == AUTO:
+            # A failed attempt removes its partial file, the retry starts the image over
+            return self._run_planned(height, width, overlap, False, True,
+                                     lambda plan: self._write_png(image, output_path, plan.tile_size, plan.overlap,
+                                                                  plan.batch_size, on_tile, alpha, compress_level),
+                                     on_plan)
+        return self._write_png(image, output_path, tile_size, overlap, batch_size, on_tile, alpha, compress_level)
+
+    def _write_png(self, image, output_path, tile_size, overlap, batch_size, on_tile, alpha, compress_level):
+        _, _, height, width = image.shape
+        with self._lock, torch.inference_mode(), \
+                PngStreamWriter(output_path, width * SCALE, height * SCALE, compress_level) as writer:
+            for _, band in iter_upscaled_rows(self._forward_for(alpha), image, SCALE, tile_size, overlap, batch_size,
+                                              on_tile):
+                rows = band.mul_(255.0).round_().to(torch.uint8).permute(1, 2, 0).contiguous()
+                writer.write_rows(rows.numpy())
+        return output_path
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_service(model_path=DEFAULT_MODEL_PATH, device=None, precision=PRECISION, channels_last=CHANNELS_LAST,
+                compile=COMPILE, backend=BACKEND, dense_buffer=DENSE_BUFFER):
+    """Process-wide ESRGANService for a weights file, device, backend and inference mode, created on first use"""
+
+    key = (os.path.abspath(model_path), device, precision, channels_last, compile, backend, dense_buffer)
+    with _services_lock:
+        service = _services.get(key)
+        if service is None:
+            service = _services[key] = ESRGANService(model_path, device, precision, channels_last, compile,
+                                                     backend, dense_buffer=dense_buffer)
+        return service
+
+
+def profile_path(profile):
+    """Weights file of a named profile: full (23 blocks) or fast (distilled student)"""
+
+    if profile not in PROFILES:
+        raise ValueError("unknown ESRGAN profile: {:s}".format(profile))
+    return PROFILES[profile]
+
+
+def release_services():
+    """Drops every cached service so the weights can be freed"""
+
+    with _services_lock:
+        _services.clear()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
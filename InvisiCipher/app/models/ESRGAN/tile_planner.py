@@ -0,0 +1,156 @@
+import os
+import warnings
+from collections import namedtuple
+import torch
+from app.models.ESRGAN.tiling import count_tiles, TILE_SIZE, TILE_OVERLAP, TILE_BATCH_SIZE
+
+'''
+Tile and batch size selection for RRDBNet from the memory that is actually free
+Peak activation memory is estimated from the network config, the largest tile (or the whole image)
+that fits the budget is used and the plan backs off when an allocation still fails
+'''
+
+AUTO = "auto"
+
+# Candidate tile sizes, largest first
+TILE_SIZES = (1024, 768, 512, 384, 256, 192, 128, 96, 64)
+MAX_BATCH_SIZE = 8
+
+# Share of the free memory the upscaler may plan for, the rest is headroom for the process and other work
+MEMORY_FRACTION = float(os.environ.get("INVISICIPHER_ESRGAN_MEMORY_FRACTION", "0.6"))
+# Allocator fragmentation on top of the raw tensor sizes
+OVERHEAD = 1.25
+
+TilePlan = namedtuple("TilePlan", ["tile_size", "batch_size", "overlap", "estimated_bytes", "available_bytes"])
+
+
+def available_memory(device):
+    """Free bytes on the device: CUDA free memory, or MemAvailable of the host (psutil or /proc/meminfo)"""
+
+    if device.type == 'cuda':
+        return torch.cuda.mem_get_info(device)[0]
+    try:
+        import psutil
+
+        return psutil.virtual_memory().available
+    except ImportError:
+        pass
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def activation_bytes(height, width, nf=64, gc=32, scale=4, batch_size=1, element_size=4):
+    """Peak activation bytes of one RRDBNet forward pass on a (batch_size, 3, height, width) input
+
+    The trunk holds about 5 * nf + 8 * gc channels at input resolution (features, block inputs and the dense
+    concatenation), the upsampler three nf channel maps (interpolated input, conv output and the convolution's
+    reordered copy) and the output at scale x the resolution. The number of blocks does not matter,
+    they run one after another. Calibrated against the peak RSS of CPU forward passes.
+    """
+
+    trunk = 5 * nf + 8 * gc
+    upsampler = (3 * nf + 3) * scale * scale
+    return int(max(trunk, upsampler) * height * width * batch_size * element_size * OVERHEAD)
+
+
+def _fixed_bytes(height, width, scale, streaming=False):
+    # Input, float and uint8 output of the whole image (not held when streaming to a file),
+    # no choice of tile size changes these
+    pixels = height * width
+    fixed = 3 * pixels * 4
+    if not streaming:
+        fixed += 3 * pixels * scale * scale * (4 + 1)
+    return fixed
+
+
+def _row_bytes(height, width, tile_size, scale):
+    # Tiling row accumulators and their carry
+    if tile_size is None:
+        return 0
+    return 2 * 4 * min(tile_size, height) * scale * width * scale * 4
+
+
+def plan_tiles(height, width, device, nf=64, gc=32, scale=4, overlap=TILE_OVERLAP, allow_whole=True,
+               memory_fraction=MEMORY_FRACTION, streaming=False):
+    """Largest tile and batch size whose estimated memory fits the free memory of device
+
+    Tiles are sized against the budget left after the fixed cost of the input and the full-size output.
+    allow_whole lets small images run in one forward pass, streaming leaves the full-size output out
+    of the estimate (rows are written out as they finish). Without a way to read the free memory
+    images up to one default tile run whole (with allow_whole), others use the default tile and batch size.
+    When not even the smallest tile fits next to the fixed cost, smaller tiles would only slow the run down:
+    a RuntimeWarning suggests streaming and the default tile and batch size are used.
+    """
+
+    available = available_memory(device)
+    fixed = _fixed_bytes(height, width, scale, streaming)
+
+    def tile_bytes(tile_size, batch_size):
+        tile_h, tile_w = (height, width) if tile_size is None else (min(tile_size, height), min(tile_size, width))
+        return activation_bytes(tile_h, tile_w, nf, gc, scale, batch_size) + \
+            _row_bytes(height, width, tile_size, scale)
+
+    def plan(tile_size, batch_size):
+        return TilePlan(tile_size, batch_size, overlap, fixed + tile_bytes(tile_size, batch_size), available)
+
+    if available is None:
+        if allow_whole and height * width <= TILE_SIZE * TILE_SIZE:
+            return plan(None, 1)
+        return plan(TILE_SIZE, TILE_BATCH_SIZE)
+    tile_budget = available * memory_fraction - fixed
+    if allow_whole and tile_bytes(None, 1) <= tile_budget:
+        return plan(None, 1)
+
+    candidates = [size for size in TILE_SIZES
+                  if not (allow_whole and size >= max(height, width)) and tile_bytes(size, 1) <= tile_budget]
+    if not candidates:
+        gigabyte = 1024 ** 3
+        warnings.warn("{:d}x{:d} leaves no room for tiles: the input and output alone take {:.2f} GB of a {:.2f} GB "
+                      "budget, smaller tiles cannot reduce that. Stream the result to a PNG (upscale_to_png) "
+                      "instead.".format(width, height, fixed / gigabyte, available * memory_fraction / gigabyte),
+                      RuntimeWarning)
+        return plan(TILE_SIZE, TILE_BATCH_SIZE)
+
+    tile_size = candidates[0]
+    tiles = count_tiles(height, width, tile_size, overlap)
+    batch_size = 1
+    while batch_size < min(MAX_BATCH_SIZE, tiles) and tile_bytes(tile_size, batch_size + 1) <= tile_budget:
+        batch_size += 1
+    return plan(tile_size, batch_size)
+
+
+def back_off(plan, height, width):
+    """Smaller plan after an allocation failure, halves the batch first and then the tile, None when exhausted"""
+
+    if plan.batch_size > 1:
+        return plan._replace(batch_size=plan.batch_size // 2)
+    # Tiles at least as large as the image would run it whole again
+    limit = max(height, width) if plan.tile_size is None else min(plan.tile_size, max(height, width))
+    smaller = [size for size in TILE_SIZES if size < limit]
+    if not smaller:
+        return None
+    return plan._replace(tile_size=smaller[0])
+
+
+def is_out_of_memory(error):
+    """True for allocation failures: torch's OutOfMemoryError (CUDA), MemoryError, or a failed CPU allocation"""
+
+    if isinstance(error, (torch.cuda.OutOfMemoryError, MemoryError)):
+        return True
+    # The CPU allocator raises a plain RuntimeError, only its own message tells it apart
+    return type(error) is RuntimeError and "DefaultCPUAllocator: can't allocate memory" in str(error)
+
+
+def describe(plan, height, width):
+    gigabyte = 1024 ** 3
+    tiles = "whole image" if plan.tile_size is None else "{:d}px tiles, batch {:d}, overlap {:d}".format(
+        plan.tile_size, plan.batch_size, plan.overlap)
+    available = "unknown" if plan.available_bytes is None else "{:.2f} GB".format(plan.available_bytes / gigabyte)
+    return "Tile plan for {:d}x{:d}: {:s} (estimated {:.2f} GB, {:s} available)".format(
+        width, height, tiles, plan.estimated_bytes / gigabyte, available)
@@ -0,0 +1,106 @@
+import torch
+
+'''
+Tiled super-resolution with bounded memory
+Splits the input into overlapping tiles, upscales several tiles per forward pass and feather-blends the seams.
+Output is produced one tile row at a time, so only a band of the result has to be held at once
+'''
+
+TILE_SIZE = 192
+TILE_OVERLAP = 16
+TILE_BATCH_SIZE = 2
+
+
+def tile_starts(length, tile, overlap):
+    """Origins of equally sized tiles covering length, the last tile is shifted back to end at the border"""
+
+    if length <= tile:
+        return [0]
+    stride = tile - overlap
+    starts = list(range(0, length - tile, stride))
+    return starts + [length - tile]
+
+
+def count_tiles(height, width, tile_size=TILE_SIZE, overlap=TILE_OVERLAP):
+    """Number of tiles iter_upscaled_rows runs for a height x width image"""
+
+    tile_h, tile_w = min(tile_size, height), min(tile_size, width)
+    overlap = min(overlap, tile_size - 1)
+    return len(tile_starts(height, tile_h, overlap)) * len(tile_starts(width, tile_w, overlap))
+
+
+def _ramp(length, ramp, first, last):
+    # 1D blend weights: linear fade over ramp pixels on sides shared with a neighbouring tile
+    weights = torch.ones(length)
+    if ramp:
+        edge = (torch.arange(ramp, dtype=torch.float32) + 0.5) / ramp
+        if not first:
+            weights[:ramp] = edge
+        if not last:
+            weights[-ramp:] = edge.flip(0)
+    return weights
+
+
+def _model_device(model):
+    try:
+        return next(model.parameters()).device
+    except (AttributeError, StopIteration):
+        return torch.device('cpu')
+
+
+def iter_upscaled_rows(model, image, scale=4, tile_size=TILE_SIZE, overlap=TILE_OVERLAP, batch_size=TILE_BATCH_SIZE,
+                       on_tile=None):
+    """Upscales a (1, 3, H, W) float image tile by tile
+
+    Yields (y, band) pairs where band is a finished (3, h, W * scale) slice of the output starting at row y.
+    Memory is bounded by one row of tiles regardless of the image size.
+    on_tile(y, x, tile) is called with every upscaled (3, h, w) tile in [0, 1] and its output position before
+    blending, for progressive previews.
+    """
+
+    _, channels, height, width = image.shape
+    tile_h, tile_w = min(tile_size, height), min(tile_size, width)
+    overlap = min(overlap, tile_size - 1)
+    ys, xs = tile_starts(height, tile_h, overlap), tile_starts(width, tile_w, overlap)
+    out_w, out_tile_h, out_tile_w = width * scale, tile_h * scale, tile_w * scale
+    device = _model_device(model)
+
+    column_weights = [_ramp(out_tile_w, overlap * scale, i == 0, i == len(xs) - 1) for i in range(len(xs))]
+    carry = None
+
+    for row, y in enumerate(ys):
+        acc = torch.zeros(channels, out_tile_h, out_w)
+        weight_sum = torch.zeros(1, out_tile_h, out_w)
+        if carry is not None:
+            carry_h = carry[0].shape[1]
+            acc[:, :carry_h] += carry[0]
+            weight_sum[:, :carry_h] += carry[1]
+
+        row_weights = _ramp(out_tile_h, overlap * scale, row == 0, row == len(ys) - 1)
+        for start in range(0, len(xs), batch_size):
+            batch_xs = xs[start:start + batch_size]
+            batch = torch.cat([image[:, :, y:y + tile_h, x:x + tile_w] for x in batch_xs]).to(device)
+            with torch.inference_mode():
+                outputs = model(batch).float().cpu()
+            for i, (x, output) in enumerate(zip(batch_xs, outputs)):
+                weights = row_weights[:, None] * column_weights[start + i][None, :]
+                acc[:, :, x * scale:x * scale + out_tile_w] += output * weights
+                weight_sum[:, :, x * scale:x * scale + out_tile_w] += weights
+                if on_tile is not None:
+                    on_tile(y * scale, x * scale, output.clamp(0, 1))
+
+        # Rows above the next tile row can no longer change
+        done = (ys[row + 1] - y) * scale if row + 1 < len(ys) else out_tile_h
+        yield y * scale, (acc[:, :done] / weight_sum[:, :done]).clamp_(0, 1)
+        carry = (acc[:, done:], weight_sum[:, done:])
+
+
+def upscale_tiled(model, image, scale=4, tile_size=TILE_SIZE, overlap=TILE_OVERLAP, batch_size=TILE_BATCH_SIZE,
+                  on_tile=None):
+    """Upscales a (1, 3, H, W) float image with tiles, returns the (1, 3, H * scale, W * scale) result in [0, 1]"""
+
+    _, channels, height, width = image.shape
+    output = torch.empty(1, channels, height * scale, width * scale)
+    for y, band in iter_upscaled_rows(model, image, scale, tile_size, overlap, batch_size, on_tile):
+        output[0, :, y:y + band.shape[1]] = band
+    return output
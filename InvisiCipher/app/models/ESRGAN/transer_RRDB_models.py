@@ -52,4 +52,5 @@ crt_net['conv_last.weight'] = pretrained_net['model.10.weight']
 crt_net['conv_last.bias'] = pretrained_net['model.10.bias']
 
 torch.save(crt_net, save_path)
-print('Saving to ', save_path)
\ No newline at end of file
+print('Saving to ', save_path)
+print('Convert for memory-mapped loading with: python -m app.models.ESRGAN.weights', save_path)
@@ -1,40 +1,36 @@
 import cv2
-import numpy as np
-import torch
 import os
-from app.models.ESRGAN import RRDBNet_arch as arch
-
-
-def upscale_image(image_filepath):
+from app.models.ESRGAN.service import get_service, profile_path, PRECISION, BACKEND, PROFILE
+from app.models.ESRGAN.tiling import TILE_OVERLAP, TILE_BATCH_SIZE
+from app.models.ESRGAN.tile_planner import AUTO
+
+
+def upscale_image(image_filepath, tile_size=AUTO, overlap=TILE_OVERLAP, batch_size=TILE_BATCH_SIZE,
+                  output_filepath=None, precision=PRECISION, backend=BACKEND, on_tile=None,
+                  alpha=None, profile=PROFILE, on_plan=None):
+    # tile_size="auto" sizes tiles and batches from the free memory, None runs the whole image in one forward pass
+    # precision="int8" uses the quantized model from quantize.py (CPU only)
+    # backend="torchscript" or "onnx" runs the graphs written by export.py instead of eager RRDBNet
+    # on_tile(y, x, tile) receives every finished RGB float tile for progressive display
+    # on_plan(plan) receives every TilePlan tried with tile_size="auto", again after an out of memory back-off
+    # alpha in [0, 1] blends the PSNR and ESRGAN generators, 1 (or None) is plain ESRGAN
+    # profile="fast" uses the distilled student from distill.py instead of the full 23 block generator
+    # Tiled .png outputs are streamed to disk row by row, the full-size result is never held in memory
     os.environ["PYTORCH_CUDA_ALLOC_CONF"] = "max_split_size_mb:400"
-    # Resolve model path relative to this file
-    model_path = os.path.join(os.path.dirname(__file__), "models", "RRDB_ESRGAN_x4.pth")
-    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-
-    model = arch.RRDBNet(3, 3, 64, 23, gc=32)
-    state_dict = torch.load(model_path, map_location=device)
-    model.load_state_dict(state_dict, strict=True)
-    model.eval()
-    model = model.to(device)
-
-    print('Model path {:s}. \nUp-scaling...'.format(model_path))
 
-    image = cv2.imread(image_filepath, cv2.IMREAD_COLOR)
-    image = image * 1.0 / 255
-    image = torch.from_numpy(np.transpose(image[:, :, [2, 1, 0]], (2, 0, 1))).float()
-    image_low_res = image.unsqueeze(0)
-    image_low_res = image_low_res.to(device)
+    # Shared model, weights are loaded and moved to the device only on the first call
+    service = get_service(profile_path(profile), device='cpu' if precision == "int8" else None, precision=precision,
+                          backend=backend)
 
-    with torch.no_grad():
-        image_high_res = model(image_low_res).data.squeeze().float().cpu().clamp_(0, 1).numpy()
-    image_high_res = np.transpose(image_high_res[[2, 1, 0], :, :], (1, 2, 0))
-    image_high_res = (image_high_res * 255.0).round().astype(np.uint8)
+    print('Model path {:s}. \nUp-scaling...'.format(service.model_path))
 
-    output_filepath = os.path.abspath('upscaled.png')
-    cv2.imwrite(output_filepath, image_high_res)
+    output_filepath = output_filepath or os.path.abspath('upscaled.png')
+    if tile_size is not None and output_filepath.lower().endswith('.png'):
+        service.upscale_to_png(image_filepath, output_filepath, tile_size, overlap, batch_size, on_tile, alpha,
+                               on_plan=on_plan)
+    else:
+        image_high_res = service.upscale(image_filepath, tile_size, overlap, batch_size, on_tile, alpha, on_plan)
+        cv2.imwrite(output_filepath, image_high_res)
     print("image saved as: ", output_filepath)
 
     return output_filepath
-
-
-
@@ -0,0 +1,108 @@
+import time
+import argparse
+import cv2
+import torch
+from app.models.ESRGAN.service import get_service, bgr_to_tensor, tensor_to_bgr, DEFAULT_MODEL_PATH, SCALE
+from app.models.ESRGAN.tiling import TILE_SIZE, TILE_OVERLAP, TILE_BATCH_SIZE
+from app.models.pipeline import run_pipeline
+
+'''
+Streaming video super-resolution
+A reader thread decodes frames, the main thread upscales whole batches (tiled for large frames)
+and a writer thread encodes (app.models.pipeline), connected by bounded queues so memory stays constant
+for any video length
+'''
+
+DEFAULT_FOURCC = 'mp4v'
+
+def _batches(capture, batch_size):
+    batch = []
+    while True:
+        success, frame = capture.read()
+        if not success:
+            break
+        batch.append(frame)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def upscale_video(video_path, output_path, batch_size=4, queue_size=4, fourcc=DEFAULT_FOURCC, start_frame=0,
+                  tile_size=TILE_SIZE, overlap=TILE_OVERLAP, model_path=DEFAULT_MODEL_PATH):
+    """Upscales a video x4 frame by frame, returns frame count, seconds and fps
+
+    Frames up to tile_size x tile_size are upscaled batch_size at a time in one forward pass, larger frames
+    go through the tiled engine. start_frame resumes an interrupted run: output_path then holds the frames
+    from start_frame on, to be concatenated with the earlier part.
+    """
+
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        raise IOError("could not open video {:s}".format(video_path))
+    fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+    width, height = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)), int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    total = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    if start_frame:
+        capture.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    tiled = width * height > tile_size * tile_size
+
+    service = get_service(model_path)
+    writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*fourcc), fps, (width * SCALE, height * SCALE))
+    if not writer.isOpened():
+        capture.release()
+        raise IOError("could not open {:s} for writing with codec {:s}".format(output_path, fourcc))
+
+    count = 0
+    start = time.perf_counter()
+
+    def step(batch):
+        nonlocal count
+        batch = torch.stack([bgr_to_tensor(frame) for frame in batch])
+        frames = service.upscale_tensor(batch, tile_size if tiled else None, overlap, TILE_BATCH_SIZE)
+        count += len(batch)
+        elapsed = time.perf_counter() - start
+        print("\rUpscaled frame {:d}/{:d} ({:.2f} frames/sec)".format(
+            start_frame + count, total, count / elapsed), end="")
+        return frames
+
+    def write(frames):
+        for frame in frames:
+            writer.write(tensor_to_bgr(frame))
+
+    try:
+        run_pipeline(_batches(capture, batch_size), step, write, queue_size, name="sr-video")
+    finally:
+        writer.release()
+        capture.release()
+
+    elapsed = time.perf_counter() - start
+    stats = {"frames": count, "seconds": elapsed, "fps": count / elapsed if elapsed else 0.0}
+    print("\nWrote {:s}: frames {:d}-{:d} in {:.1f}s ({:.2f} frames/sec)".format(
+        output_path, start_frame, start_frame + count - 1, elapsed, stats["fps"]))
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Upscale a video x4 with ESRGAN')
+    parser.add_argument('video')
+    parser.add_argument('output')
+    parser.add_argument('--model_path', default=DEFAULT_MODEL_PATH)
+    parser.add_argument('--batch_size', type=int, default=4, help='frames per forward pass')
+    parser.add_argument('--queue_size', type=int, default=4, help='batches buffered between the stages')
+    parser.add_argument('--fourcc', default=DEFAULT_FOURCC)
+    parser.add_argument('--start_frame', type=int, default=0, help='resume from this frame index')
+    parser.add_argument('--tile_size', type=int, default=TILE_SIZE, help='larger frames are upscaled in tiles')
+    parser.add_argument('--overlap', type=int, default=TILE_OVERLAP)
+    args = parser.parse_args()
+
+    upscale_video(args.video, args.output, args.batch_size, args.queue_size, args.fourcc, args.start_frame,
+                  args.tile_size, args.overlap, args.model_path)
+
+'''
+Sample run (from InvisiCipher/):
+python -m app.models.ESRGAN.upscale_video input.mp4 app/models/ESRGAN/results/enhanced_video.mp4
+resume after an interruption at frame 1200:
+python -m app.models.ESRGAN.upscale_video input.mp4 enhanced_part2.mp4 --start_frame 1200
+'''
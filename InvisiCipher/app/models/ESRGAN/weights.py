@@ -0,0 +1,80 @@
+import os
+import argparse
+import torch
+
+'''
+Memory-mapped ESRGAN weights
+Checkpoints converted to safetensors (or re-saved in torch's zip format) are mapped instead of unpickled,
+so every worker process reads the same page cache pages and only touches weights when they are used
+'''
+
+FORMATS = ("safetensors", "torch")
+
+
+def safetensors_path(model_path):
+    return os.path.splitext(model_path)[0] + ".safetensors"
+
+
+def resolve_weights(model_path):
+    """Prefers the converted .safetensors file next to a .pth checkpoint when there is one"""
+
+    converted = safetensors_path(model_path)
+    if model_path.endswith(".pth") and os.path.exists(converted):
+        return converted
+    return model_path
+
+
+def load_weights(model_path, device='cpu'):
+    """Loads a state dict, memory-mapped on CPU when the file format allows it
+
+    Old (pre zip) torch checkpoints cannot be mapped and fall back to a regular load, convert them once.
+    """
+
+    device = str(device)
+    if model_path.endswith(".safetensors"):
+        from safetensors.torch import load_file
+
+        return load_file(model_path, device=device)
+    try:
+        return torch.load(model_path, map_location=device, mmap=True, weights_only=True)
+    except RuntimeError:
+        # Legacy tar/pickle checkpoint
+        return torch.load(model_path, map_location=device, weights_only=True)
+
+
+def num_blocks(state_dict):
+    """Number of RRDB blocks in an RRDBNet state dict, 23 for the released x4 weights"""
+
+    return len({key.split('.')[1] for key in state_dict if key.startswith('RRDB_trunk.')})
+
+
+def convert_weights(model_path, output_path=None, format="safetensors"):
+    """Writes a mappable copy of a checkpoint, strips the "module." prefix of DataParallel checkpoints"""
+
+    state_dict = torch.load(model_path, map_location='cpu', weights_only=True)
+    state_dict = {(k[7:] if k.startswith('module.') else k): v.contiguous() for k, v in state_dict.items()}
+    if format == "safetensors":
+        from safetensors.torch import save_file
+
+        output_path = output_path or safetensors_path(model_path)
+        save_file(state_dict, output_path)
+    else:
+        output_path = output_path or os.path.splitext(model_path)[0] + "_mmap.pth"
+        torch.save(state_dict, output_path)
+    return output_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Convert ESRGAN checkpoints for memory-mapped loading')
+    parser.add_argument('model_paths', nargs='+', help='.pth checkpoints, e.g. the output of transer_RRDB_models.py')
+    parser.add_argument('--format', choices=FORMATS, default="safetensors",
+                        help='safetensors, or the torch zip format when safetensors is not installed')
+    args = parser.parse_args()
+
+    for path in args.model_paths:
+        print("{:s} converted to: {:s}".format(path, convert_weights(path, format=args.format)))
+
+'''
+Sample run (from InvisiCipher/):
+python -m app.models.ESRGAN.weights app/models/ESRGAN/models/RRDB_ESRGAN_x4.pth app/models/ESRGAN/models/RRDB_PSNR_x4.pth
+'''
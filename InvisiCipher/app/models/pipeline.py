@@ -0,0 +1,101 @@
+import queue
+import threading
+import contextlib
+
+'''
+Bounded-queue pipelines shared by the image and video batch paths
+A reader thread runs ahead of the model, an optional writer thread encodes behind it,
+the queues between the stages keep memory constant for any input length
+'''
+
+END = object()
+
+
+def put(q, item, stop):
+    """Blocking put that gives up once stop is set, so a stalled consumer never strands the producer"""
+
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+
+def _produce(items, q, stop):
+    try:
+        for item in items:
+            if stop.is_set():
+                return
+            put(q, item, stop)
+    except Exception as e:
+        put(q, e, stop)
+        return
+    put(q, END, stop)
+
+
+def prefetch(items, queue_size=2, name="prefetch"):
+    """Iterates items on a background thread, at most queue_size ahead of the caller
+
+    Exceptions of the producer are raised in the caller. Closing the generator stops the thread,
+    which also happens when the caller drops it half way.
+    """
+
+    q = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    thread = threading.Thread(target=_produce, args=(items, q, stop), name=name, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = q.get()
+            if item is END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _consume(results, write, errors, stop):
+    try:
+        while True:
+            result = results.get()
+            if result is END:
+                return
+            write(result)
+    except Exception as e:
+        errors.append(e)
+        stop.set()
+
+
+def run_pipeline(items, predict, write, queue_size=4, name="pipeline"):
+    """Reads items on a reader thread, runs predict(item) on the calling thread and write(result) on a writer thread
+
+    Returns once everything is written, an exception in any stage stops the others and is raised here.
+    """
+
+    results = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors = []
+    writer = threading.Thread(target=_consume, args=(results, write, errors, stop), name=name + "-writer",
+                              daemon=True)
+    writer.start()
+    try:
+        with contextlib.closing(prefetch(items, queue_size, name + "-reader")) as batches:
+            for batch in batches:
+                if stop.is_set():
+                    break
+                put(results, predict(batch), stop)
+    finally:
+        put(results, END, stop)
+        writer.join()
+    if errors:
+        raise errors[0]
+
+
+'''
+Sample usage:
+run_pipeline(iter_batches(capture), model_step, encode_batch, queue_size=4, name="video")
+'''
@@ -0,0 +1,69 @@
+import cv2
+import numpy as np
+from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.QtGui import QImage
+from app.models.ESRGAN.service import SCALE
+from app.models.ESRGAN.tiling import count_tiles
+from app.models.ESRGAN.upscale_image import upscale_image
+
+
+def _to_qimage(rgb):
+    height, width = rgb.shape[:2]
+    rgb = np.ascontiguousarray(rgb)
+    return QImage(rgb.data, width, height, 3 * width, QImage.Format_RGB888).copy()
+
+
+class UpscaleWorker(QThread):
+    """Upscales an image off the UI thread and streams a progressive preview
+
+    Emits a bicubic preview first, then every finished tile, both already scaled to the display size
+    so the UI only has to paint them. finished carries the path of the full-quality result.
+    """
+
+    preview = pyqtSignal(QImage)
+    tile = pyqtSignal(int, int, QImage, int, int)  # x, y, tile, tiles done, tiles total
+    finished_path = pyqtSignal(str)
+    failed = pyqtSignal(str)
+
+    def __init__(self, image_filepath, output_filepath, display_width, display_height, parent=None):
+        super().__init__(parent)
+        self.image_filepath = image_filepath
+        self.output_filepath = output_filepath
+        self.display_width = display_width
+        self.display_height = display_height
+
+    def run(self):
+        try:
+            image = cv2.imread(self.image_filepath, cv2.IMREAD_COLOR)
+            if image is None:
+                raise IOError("could not read {:s}".format(self.image_filepath))
+            height, width = image.shape[:2]
+            out_h, out_w = height * SCALE, width * SCALE
+            factor = min(self.display_width / out_w, self.display_height / out_h, 1.0)
+            preview_size = (max(1, round(out_w * factor)), max(1, round(out_h * factor)))
+
+            preview = cv2.resize(image, preview_size, interpolation=cv2.INTER_CUBIC)
+            self.preview.emit(_to_qimage(cv2.cvtColor(preview, cv2.COLOR_BGR2RGB)))
+
+            done, total = 0, 1
+
+            def on_plan(plan):
+                # Tiles are planned from the free memory, a back-off restarts with smaller ones
+                nonlocal done, total
+                done = 0
+                total = 1 if plan.tile_size is None else count_tiles(height, width, plan.tile_size, plan.overlap)
+
+            def on_tile(y, x, tile):
+                nonlocal done
+                tile_h, tile_w = tile.shape[1:]
+                done += 1
+                x0, y0 = int(x * factor), int(y * factor)
+                size = (max(1, int((x + tile_w) * factor) - x0), max(1, int((y + tile_h) * factor) - y0))
+                rgb = (tile.numpy().transpose(1, 2, 0) * 255.0).round().astype(np.uint8)
+                self.tile.emit(x0, y0, _to_qimage(cv2.resize(rgb, size, interpolation=cv2.INTER_AREA)), done, total)
+
+            upscale_image(self.image_filepath, output_filepath=self.output_filepath, on_tile=on_tile, on_plan=on_plan)
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.finished_path.emit(self.output_filepath)
@@ -1,13 +1,11 @@
 import os
 import sys
 
-import cv2
 import shutil
-import numpy as np
-import torch
 import requests
 import subprocess
 import time
+import threading
 from PyQt5.QtCore import QFile, QTextStream
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QIcon, QPixmap, QFont, QPainter, QColor
@@ -19,10 +17,12 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")
 
 from app.models.DEEP_STEGO.hide_image import hide_image
 from app.models.DEEP_STEGO.reveal_image import reveal_image
-from app.models.ESRGAN import RRDBNet_arch as arch
+from app.models.DEEP_STEGO import model_registry
+from app.models.ESRGAN.service import get_service
 from app.models.encryption import aes, blowfish
 from app.ui.components.backgroundwidget import BackgroundWidget
 from app.ui.components.customtextbox import CustomTextBox
+from app.ui.components.upscaleworker import UpscaleWorker
 from app.ui.auth_screen import show_auth_screen
 
 # Get the base directory for assets
@@ -68,6 +68,8 @@ class MainAppWindow(QMainWindow):
         self.image_label = None
         self.low_res_image_filepath = None
         self.download_HR_button = None
+        self.upscale_worker = None
+        self.upscale_canvas = None
 
         # Set window properties
         self.setWindowTitle("ImageSteganography")
@@ -393,6 +395,7 @@ class MainAppWindow(QMainWindow):
             self.main_content.set_background_image(bg_path)
         self.secret_image_filepath = None
         self.cover_image_filepath = None
+        self.preload_steg_model("hide")
         # Clear the main window layout
         self.clear_main_layout()
 
@@ -493,6 +496,7 @@ class MainAppWindow(QMainWindow):
         bg_path = os.path.join(PROJECT_ROOT, "bg.jpg")
         if os.path.exists(bg_path):
             self.main_content.set_background_image(bg_path)
+        self.preload_steg_model("reveal")
         self.clear_main_layout()
 
         # Add content to the super resolution page
@@ -579,6 +583,7 @@ class MainAppWindow(QMainWindow):
         if os.path.exists(bg_path):
             self.main_content.set_background_image(bg_path)
         self.low_res_image_filepath = None
+        self.preload_upscaler()
         # Clear the main window layout
         self.clear_main_layout()
 
@@ -659,34 +664,54 @@ class MainAppWindow(QMainWindow):
         if self.low_res_image_filepath is None:
             QMessageBox.information(self, "Upscaling Error", "Please select the low-resolution image first.")
             return
-        os.environ["PYTORCH_CUDA_ALLOC_CONF"] = "max_split_size_mb:400"
         model_path = os.path.join(os.path.dirname(BASE_DIR), "models/ESRGAN/models/RRDB_ESRGAN_x4.pth")
         if not os.path.exists(model_path):
             QMessageBox.critical(self, "Upscaling Error", f"ESRGAN model not found at:\n{model_path}")
             return
-        device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
 
-        model = arch.RRDBNet(3, 3, 64, 23, gc=32)
-        state_dict = torch.load(model_path, map_location=device)
-        model.load_state_dict(state_dict, strict=True)
-        model.eval()
-        model = model.to(device)
-
-        print('Model path {:s}. \nUp-scaling...'.format(model_path))
+        if self.upscale_worker is not None and self.upscale_worker.isRunning():
+            QMessageBox.information(self, "Upscaling", "An image is already being upscaled.")
+            return
 
-        image = cv2.imread(self.low_res_image_filepath, cv2.IMREAD_COLOR)
-        image = image * 1.0 / 255
-        image = torch.from_numpy(np.transpose(image[:, :, [2, 1, 0]], (2, 0, 1))).float()
-        image_low_res = image.unsqueeze(0)
-        image_low_res = image_low_res.to(device)
+        # Progressive mode: a bicubic preview first, then tiles painted in as they finish,
+        # the full-quality file is displayed once the worker is done
+        high_res_image_path = os.path.abspath(os.path.join(os.path.dirname(BASE_DIR), "upscaled.png"))
+        worker = UpscaleWorker(self.low_res_image_filepath, high_res_image_path, 384, 384, self)
+        worker.preview.connect(lambda image: self.show_upscale_preview(label, image))
+        worker.tile.connect(lambda x, y, image, done, total: self.paint_upscale_tile(label, x, y, image, done, total))
+        worker.finished_path.connect(lambda path: self.finish_upscale(label, path))
+        worker.failed.connect(
+            lambda error: QMessageBox.critical(self, "Upscaling Error", f"Failed to upscale the image.\n{error}"))
+        self.upscale_worker = worker
+        worker.start()
+
+    def show_upscale_preview(self, label, image):
+        self.upscale_canvas = QPixmap.fromImage(image)
+        try:
+            self.set_label_pixmap_box(label, self.upscale_canvas, 384, 384)
+            self.low_res_image_text_label.setText("Up-scaling... (preview)")
+        except RuntimeError:
+            # The page was left while the worker was running
+            pass
 
-        with torch.no_grad():
-            image_high_res = model(image_low_res).data.squeeze().float().cpu().clamp_(0, 1).numpy()
-        image_high_res = np.transpose(image_high_res[[2, 1, 0], :, :], (1, 2, 0))
-        image_high_res = (image_high_res * 255.0).round().astype(np.uint8)
+    def paint_upscale_tile(self, label, x, y, image, done, total):
+        if self.upscale_canvas is None:
+            return
+        painter = QPainter(self.upscale_canvas)
+        painter.drawImage(x, y, image)
+        painter.end()
+        try:
+            self.set_label_pixmap_box(label, self.upscale_canvas, 384, 384)
+            self.low_res_image_text_label.setText(f"Up-scaling... {done}/{total} tiles")
+        except RuntimeError:
+            pass
 
-        high_res_image_path = os.path.abspath(os.path.join(os.path.dirname(BASE_DIR), "upscaled.png"))
-        cv2.imwrite(high_res_image_path, image_high_res)
+    def finish_upscale(self, label, high_res_image_path):
+        self.upscale_canvas = None
+        try:
+            label.isVisible()
+        except RuntimeError:
+            return
 
         # Display the high resolution image
         if os.path.exists(high_res_image_path):
@@ -800,28 +825,53 @@ class MainAppWindow(QMainWindow):
             if src.isNull():
                 self.set_label_placeholder(label, box_width, box_height, "Select the image")
                 return
-            scaled = src.scaled(box_width, box_height, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-            canvas = QPixmap(box_width, box_height)
-            canvas.fill(QColor(0, 0, 0, 0))
-            painter = QPainter(canvas)
-            x = (box_width - scaled.width()) // 2
-            y = (box_height - scaled.height()) // 2
-            painter.drawPixmap(x, y, scaled)
-            painter.end()
-            label.setPixmap(canvas)
-            label.setFixedSize(box_width, box_height)
+            self.set_label_pixmap_box(label, src, box_width, box_height)
         except Exception:
             self.set_label_placeholder(label, box_width, box_height, "Select the image")
 
+    def set_label_pixmap_box(self, label: QLabel, src: QPixmap, box_width: int, box_height: int):
+        scaled = src.scaled(box_width, box_height, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        canvas = QPixmap(box_width, box_height)
+        canvas.fill(QColor(0, 0, 0, 0))
+        painter = QPainter(canvas)
+        x = (box_width - scaled.width()) // 2
+        y = (box_height - scaled.height()) // 2
+        painter.drawPixmap(x, y, scaled)
+        painter.end()
+        label.setPixmap(canvas)
+        label.setFixedSize(box_width, box_height)
+
     def logout(self):
         # Clear auth state and return to auth screen without exiting app
         self.is_authenticated = False
         self.auth_token = None
         # Hide sidebar when logging out
         self.side_navigation.hide()
+        # Give the steg model memory back while nobody is signed in
+        model_registry.unload()
         QMessageBox.information(self, "Logged Out", "You have been logged out.")
         show_auth_screen(self)
 
+    def preload_steg_model(self, name: str):
+        # Warm the shared model in the background so the page stays responsive
+        def _preload():
+            try:
+                model_registry.preload(name)
+            except Exception as e:
+                print("Failed to preload {:s} model: {}".format(name, e))
+
+        threading.Thread(target=_preload, daemon=True).start()
+
+    def preload_upscaler(self):
+        # Load the ESRGAN weights in the background while the user picks an image
+        def _preload():
+            try:
+                get_service()
+            except Exception as e:
+                print("Failed to preload ESRGAN model: {}".format(e))
+
+        threading.Thread(target=_preload, daemon=True).start()
+
     def load_stylesheet(self):
         stylesheet = QFile(os.path.join(BASE_DIR, "styles/style.qss"))
         if stylesheet.open(QFile.ReadOnly | QFile.Text):
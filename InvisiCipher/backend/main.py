@@ -1,3 +1,4 @@
+import os
 from datetime import datetime, timedelta
 from typing import Optional
 
@@ -17,6 +18,9 @@ JWT_EXP_MIN = 30
 
 DATABASE_URL = "sqlite:///./invisicipher_auth.db"
 
+# Comma separated steg models to load at startup, e.g. "hide,reveal"
+PRELOAD_STEG_MODELS = [m for m in os.environ.get("INVISICIPHER_PRELOAD_STEG_MODELS", "").split(",") if m]
+
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
@@ -115,6 +119,20 @@ app.add_middleware(
 )
 
 
+@app.on_event("startup")
+def preload_steg_models():
+    if PRELOAD_STEG_MODELS:
+        from app.models.DEEP_STEGO import model_registry
+        model_registry.preload(*PRELOAD_STEG_MODELS)
+
+
+@app.on_event("shutdown")
+def unload_steg_models():
+    if PRELOAD_STEG_MODELS:
+        from app.models.DEEP_STEGO import model_registry
+        model_registry.unload()
+
+
 @app.post("/api/auth/signup", response_model=UserResponse, status_code=201)
 def signup(body: SignUpRequest, db: Session = Depends(get_db)):
     if db.query(User).filter((User.username == body.username) | (User.email == body.email)).first():